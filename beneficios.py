@@ -3,7 +3,6 @@ import pandas as pd
 import main
 import utilitarios as ut
 import warnings
-import io
 from datetime import datetime
 
 warnings.filterwarnings(
@@ -63,6 +62,9 @@ with st.sidebar:
     
     # Checkbox Ednaldo
     ednaldo_check = st.checkbox("Ednaldo")
+
+    # Tabelas guardadas na sessão com filial/CC categóricos e textos do Arrow (menos memória)
+    compacto_check = st.checkbox("Modo compacto (menos memória)")
     
     st.divider()
     
@@ -74,6 +76,8 @@ with st.sidebar:
         st.session_state.relatorio_gerado = None
     if 'dados_bi_gerados' not in st.session_state:
         st.session_state.dados_bi_gerados = None
+    if 'mes_processado' not in st.session_state:
+        st.session_state.mes_processado = None
 
     # Botão processar relatório (habilitado apenas quando todos os arquivos estão carregados)
     if st.button(
@@ -81,51 +85,90 @@ with st.sidebar:
         disabled=not todos_arquivos_carregados,
         use_container_width=True
     ):
+        # Ler e consolidar a planilha de benefícios uma única vez para os dois relatórios
+        beneficios = main.preparar_beneficios(
+            realizado,
+            ednaldo_check
+        )
+
         # Gerar os relatórios e armazenar no session_state
         realizado_vs_orcado = main.gerar_relatorio(
-            realizado, 
+            beneficios,
             orcado,
-            ednaldo_check,
-            meses.get(mes_selecionado)
+            meses.get(mes_selecionado),
+            compacto=compacto_check
         )
         
         tabela_realizado, tabela_bi = main.gerar_comparacao_bi(
-            realizado,
+            beneficios,
             bi_detalhado,
-            ednaldo_check
+            compacto=compacto_check
         )
         
         # Armazenar os dados no session_state para persistir após o recarregamento
         st.session_state.relatorio_gerado = realizado_vs_orcado
         st.session_state.dados_bi_gerados = (tabela_realizado, tabela_bi)
+        st.session_state.mes_processado = meses.get(mes_selecionado)
         
         st.success("✅ Relatório processado com sucesso!")
 
+        # Células não numéricas nas colunas de valor ficam de fora do cálculo do FINAL
+        for aba, colunas in beneficios['valores_invalidos'].items():
+            detalhes = ', '.join(f"{coluna} ({quantidade})" for coluna, quantidade in colunas.items())
+            st.warning(f"⚠️ Aba {aba}: valores não numéricos em {detalhes}")
+
+        # CPFs repetidos no mesmo benefício geram mais de uma linha por CPF no consolidado
+        for aba, cpfs_repetidos in beneficios['fanout'].items():
+            st.warning(
+                f"⚠️ Aba {aba}: {len(cpfs_repetidos)} CPF(s) com mais de uma linha; "
+                "essas linhas aparecem repetidas no relatório"
+            )
+
     # Exibir botão de download se o relatório foi gerado
     if st.session_state.relatorio_gerado is not None:
-        # Preparar o arquivo Excel
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            st.session_state.relatorio_gerado.to_excel(writer, sheet_name='Consolidado', index=False)
-            
-            # Se também quiser incluir os dados do BI no mesmo arquivo Excel
-            if st.session_state.dados_bi_gerados is not None:
-                tabela_realizado, tabela_bi = st.session_state.dados_bi_gerados
-                if tabela_realizado is not None:
-                    tabela_realizado.to_excel(writer, sheet_name='Realizado', index=False)
-                if tabela_bi is not None:
-                    tabela_bi.to_excel(writer, sheet_name='BI Detalhado', index=False)
-        
-        # Botão de download na sidebar (persistirá após o processamento)
+        # Exportação em Excel, CSV ou Parquet (com os dados do BI); o arquivo só é gerado
+        # quando pedido e fica guardado na sessão até um novo processamento
+        tabela_realizado, tabela_bi = st.session_state.dados_bi_gerados or (None, None)
+
+        # Botões na sidebar (persistirão após o processamento)
         with st.sidebar.container():
-            st.download_button(
-                label="📥 Baixar Relatório Excel",
-                data=output.getvalue(),
-                file_name=f"relatorio_beneficios_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
+            ut.exibir_exportacao(
+                'beneficios',
+                f"relatorio_beneficios_{datetime.now().strftime('%Y%m%d')}",
+                {
+                    'Consolidado': st.session_state.relatorio_gerado,
+                    'Realizado': tabela_realizado,
+                    'BI Detalhado': tabela_bi
+                },
+                main.exportar_tabelas
             )
 
+        # Snapshot Parquet do resultado, para reabrir o mês sem reprocessar os arquivos
+        if st.button("💾 Salvar Snapshot", use_container_width=True):
+            tabela_realizado, tabela_bi = st.session_state.dados_bi_gerados
+            main.salvar_snapshot(
+                f"beneficios_{st.session_state.mes_processado}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                consolidado=st.session_state.relatorio_gerado,
+                realizado=tabela_realizado,
+                bi=tabela_bi
+            )
+            st.success("✅ Snapshot salvo!")
+
+    snapshots_salvos = main.listar_snapshots('beneficios_')
+    if snapshots_salvos:
+        with st.expander("📂 Abrir Snapshot Salvo"):
+            snapshot_selecionado = st.selectbox("Snapshot:", snapshots_salvos, key="snapshot_beneficios")
+            if st.button("Abrir Snapshot", use_container_width=True):
+                tabelas = main.carregar_snapshot(snapshot_selecionado)
+                # Os painéis precisam das três tabelas (snapshots antigos do lote só têm o consolidado)
+                if {'consolidado', 'realizado', 'bi'} - tabelas.keys():
+                    st.error("❌ Este snapshot não tem as tabelas de realizado e do BI.")
+                else:
+                    st.session_state.relatorio_gerado = tabelas['consolidado']
+                    st.session_state.dados_bi_gerados = (tabelas['realizado'], tabelas['bi'])
+                    st.session_state.mes_processado = snapshot_selecionado.split('_')[1]
+                    st.rerun()
+
     # Mostrar status dos uploads
     st.subheader("📋 Status dos Arquivos")
     st.write(f"Arquivo Realizado: {'✅' if realizado else '❌'}")
@@ -138,11 +181,12 @@ if st.session_state.relatorio_gerado is not None and st.session_state.dados_bi_g
     realizado_vs_orcado = st.session_state.relatorio_gerado
     tabela_realizado, tabela_bi = st.session_state.dados_bi_gerados
     
-    # Criar as 3 abas
-    tab1, tab2, tab3 = st.tabs([
+    # Criar as abas
+    tab1, tab2, tab3, tab4 = st.tabs([
         "📊 COMPARAÇÃO BI VS DETALHADO", 
         "📈 COMPARAÇÃO REALIZADO VS PREVISTO", 
-        "📋 RESUMO RELATÓRIO DETALHADO"
+        "📋 RESUMO RELATÓRIO DETALHADO",
+        "🔀 MATRIZ DE TRANSFERÊNCIAS"
     ])
 
     with tab1:
@@ -164,6 +208,10 @@ if st.session_state.relatorio_gerado is not None and st.session_state.dados_bi_g
     with tab3:
         st.header("📋 RESUMO RELATÓRIO DETALHADO")
         ut.exibir_resumo_colaboradores(realizado_vs_orcado)
+
+    with tab4:
+        st.header("🔀 MATRIZ DE TRANSFERÊNCIAS")
+        ut.exibir_matriz_transferencias(realizado_vs_orcado)
         
 else:
     # Mensagem inicial quando nenhum arquivo foi carregado ou processamento não foi iniciado
@@ -0,0 +1,198 @@
+import copy
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+
+
+def tamanho_objeto(valor):
+    """
+    Estima a memória ocupada (em bytes) por DataFrames e coleções de DataFrames.
+    """
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, dict):
+        return sum(tamanho_objeto(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(tamanho_objeto(v) for v in valor)
+    return sys.getsizeof(valor)
+
+def hash_arquivo(fonte):
+    """
+    Calcula o SHA-256 do conteúdo de um arquivo enviado (UploadedFile/BytesIO) ou de um caminho.
+    """
+    sha = hashlib.sha256()
+    if hasattr(fonte, 'getvalue'):
+        sha.update(fonte.getvalue())
+    elif hasattr(fonte, 'read'):
+        posicao = fonte.tell()
+        fonte.seek(0)
+        sha.update(fonte.read())
+        fonte.seek(posicao)
+    else:
+        with open(fonte, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(1 << 20), b''):
+                sha.update(bloco)
+    return sha.hexdigest()
+
+
+class CacheArquivos:
+    """
+    Cache LRU dos dados lidos dos arquivos enviados.
+
+    Mantém em memória até max_memoria_mb; se diretorio for informado, os resultados também
+    são gravados em disco (até max_disco_mb), ficando disponíveis para outras sessões e
+    após reinícios do servidor.
+    """
+
+    def __init__(self, max_memoria_mb=512, diretorio=None, max_disco_mb=2048):
+        self.max_memoria = max_memoria_mb * 1024 * 1024
+        self.diretorio = diretorio
+        self.max_disco = max_disco_mb * 1024 * 1024
+        self._itens = OrderedDict()
+        self._memoria_usada = 0
+        self._trava = threading.Lock()
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho_disco(self, chave):
+        return os.path.join(self.diretorio, f"{chave}.pkl")
+
+    def obter(self, chave):
+        """
+        Retorna (True, valor) se a chave estiver no cache, senão (False, None).
+        """
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return True, self._itens[chave][0]
+
+        if self.diretorio:
+            # A pasta é compartilhada com outros processos, que podem remover o arquivo a qualquer momento
+            try:
+                with open(self._caminho_disco(chave), 'rb') as arquivo:
+                    valor = pickle.load(arquivo)
+                os.utime(self._caminho_disco(chave))
+            except Exception:
+                return False, None
+            self._guardar_memoria(chave, valor)
+            return True, valor
+
+        return False, None
+
+    def guardar(self, chave, valor):
+        self._guardar_memoria(chave, valor)
+        if self.diretorio:
+            # Grava em um arquivo temporário e renomeia, para ninguém ler um pickle pela metade
+            descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+            try:
+                with os.fdopen(descritor, 'wb') as arquivo:
+                    pickle.dump(valor, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temporario, self._caminho_disco(chave))
+            except BaseException:
+                self._remover(temporario)
+                raise
+            self._limitar_disco()
+
+    def _guardar_memoria(self, chave, valor):
+        tamanho = tamanho_objeto(valor)
+        if tamanho > self.max_memoria:
+            return
+        with self._trava:
+            if chave in self._itens:
+                self._memoria_usada -= self._itens.pop(chave)[1]
+            self._itens[chave] = (valor, tamanho)
+            self._memoria_usada += tamanho
+            # Remove os itens usados há mais tempo até caber no limite
+            while self._memoria_usada > self.max_memoria:
+                _, (_, tamanho_removido) = self._itens.popitem(last=False)
+                self._memoria_usada -= tamanho_removido
+
+    @staticmethod
+    def _remover(caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+    def _limitar_disco(self):
+        # Outros processos podem remover arquivos enquanto a pasta é percorrida;
+        # arquivos que sumiram são simplesmente ignorados
+        arquivos = []
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith('.pkl'):
+                caminho = os.path.join(self.diretorio, nome)
+                try:
+                    situacao = os.stat(caminho)
+                except OSError:
+                    continue
+                arquivos.append((situacao.st_mtime, situacao.st_size, caminho))
+        arquivos.sort()
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in arquivos:
+            if total <= self.max_disco:
+                break
+            self._remover(caminho)
+            total -= tamanho
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self._memoria_usada = 0
+        if self.diretorio:
+            for nome in os.listdir(self.diretorio):
+                if nome.endswith(('.pkl', '.tmp')):
+                    self._remover(os.path.join(self.diretorio, nome))
+
+
+cache_padrao = CacheArquivos()
+
+def configurar_cache(max_memoria_mb=512, diretorio=None, max_disco_mb=2048):
+    """
+    Substitui o cache padrão usado pelas funções decoradas com em_cache.
+    """
+    global cache_padrao
+    cache_padrao = CacheArquivos(max_memoria_mb, diretorio, max_disco_mb)
+    return cache_padrao
+
+def em_cache(ignorar=(), validar=None):
+    """
+    Decorador para funções cujo primeiro argumento é um arquivo (caminho ou upload).
+    A chave do cache é o hash do conteúdo do arquivo mais os demais argumentos
+    (exceto os listados em ignorar). Resultados reprovados por validar não são guardados.
+    O valor devolvido é sempre uma cópia, para que alterações não afetem o cache.
+    """
+    def decorador(funcao):
+        assinatura = inspect.signature(funcao)
+
+        @wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            argumentos = assinatura.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            fonte = next(iter(argumentos.arguments.values()))
+            parametros = [
+                (nome, valor) for nome, valor in list(argumentos.arguments.items())[1:]
+                if nome not in ignorar
+            ]
+            chave = hashlib.sha256(
+                f"{funcao.__module__}.{funcao.__qualname__}|{hash_arquivo(fonte)}|{parametros!r}".encode()
+            ).hexdigest()
+
+            encontrado, valor = cache_padrao.obter(chave)
+            if not encontrado:
+                valor = funcao(*args, **kwargs)
+                if validar is None or validar(valor):
+                    cache_padrao.guardar(chave, valor)
+            return copy.deepcopy(valor)
+
+        return envoltorio
+    return decorador
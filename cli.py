@@ -0,0 +1,228 @@
+"""
+Execução dos relatórios pela linha de comando, sem a interface do Streamlit.
+Útil para rodar o fechamento do mês como tarefa agendada.
+
+Exemplos:
+    python cli.py beneficios --realizado beneficios.xlsx --orcado orcamento.xlsx --bi bi.xlsx --mes 03
+    python cli.py lote --realizado 01=janeiro.xlsx 02=fevereiro.xlsx 03=marco.xlsx --orcado orcamento.xlsx
+    python cli.py folha --arquivo folha.xlsx --saida relatorios/ --formato csv
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import main
+
+
+MESES = [f"{mes:02d}" for mes in range(1, 13)]
+
+
+class Cronometro:
+    """
+    Mede o tempo de cada etapa do processamento e imprime no stderr.
+    Com detalhado=True, também imprime as mensagens de progresso das funções do main.
+    """
+
+    def __init__(self, detalhado=False):
+        self.detalhado = detalhado
+        self.tempos = {}
+        self._marca = time.perf_counter()
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = self._marca = time.perf_counter()
+        yield
+        self.tempos[nome] = time.perf_counter() - inicio
+        print(f"[{self.tempos[nome]:8.2f}s] {nome}", file=sys.stderr)
+
+    def progresso(self, porcentagem, mensagem=""):
+        if self.detalhado:
+            agora = time.perf_counter()
+            print(f"           {porcentagem:3d}% {mensagem} (+{agora - self._marca:.2f}s)", file=sys.stderr)
+            self._marca = agora
+
+    def resumo(self):
+        print(f"[{sum(self.tempos.values()):8.2f}s] total", file=sys.stderr)
+
+
+def exibir_erro(log):
+    """
+    Imprime o log de carregamento retornado quando as abas não puderam ser lidas.
+    """
+    print("Erro ao carregar o arquivo de benefícios:", file=sys.stderr)
+    for chave, valor in log.items():
+        print(f"  {chave}: {valor}", file=sys.stderr)
+
+
+def exportar(abas, prefixo, args):
+    """
+    Grava as tabelas na pasta de saída no formato escolhido: um único Excel com uma aba
+    por tabela, ou um arquivo CSV/Parquet por tabela (<prefixo>_<tabela>.<formato>).
+    """
+    os.makedirs(args.saida, exist_ok=True)
+    if args.formato == 'xlsx':
+        return main.exportar_excel(
+            abas, os.path.join(args.saida, f"{prefixo}.xlsx"), dividir_arquivos=args.dividir_arquivos
+        )
+
+    destinos = []
+    for nome, tabela in abas.items():
+        destino = os.path.join(args.saida, f"{prefixo}_{main.nome_arquivo_tabela(nome)}.{args.formato}")
+        main.EXPORTADORES[args.formato](tabela, destino)
+        destinos.append(destino)
+    return destinos
+
+
+def executar_beneficios(args):
+    cronometro = Cronometro(args.detalhado)
+
+    with cronometro.etapa("Leitura e consolidação dos benefícios"):
+        beneficios = main.preparar_beneficios(
+            args.realizado,
+            args.ednaldo,
+            progresso=cronometro.progresso,
+            paralelo=args.paralelo
+        )
+
+    if beneficios['consolidado'] is None:
+        exibir_erro(beneficios['planilhas'])
+        return 1
+
+    for aba, colunas in beneficios['valores_invalidos'].items():
+        detalhes = ', '.join(f"{coluna} ({quantidade})" for coluna, quantidade in colunas.items())
+        print(f"Aviso: aba {aba} com valores não numéricos em {detalhes}", file=sys.stderr)
+    for aba, cpfs_repetidos in beneficios['fanout'].items():
+        print(f"Aviso: aba {aba} com {len(cpfs_repetidos)} CPF(s) em mais de uma linha", file=sys.stderr)
+
+    with cronometro.etapa("Relatório realizado x orçado"):
+        realizado_vs_orcado = main.gerar_relatorio(
+            beneficios, args.orcado, args.mes, progresso=cronometro.progresso
+        )
+
+    with cronometro.etapa("Comparação com o BI"):
+        tabela_realizado, tabela_bi = main.gerar_comparacao_bi(
+            beneficios, args.bi, progresso=cronometro.progresso
+        )
+
+    with cronometro.etapa(f"Exportação ({args.formato})"):
+        exportar({
+            'Consolidado': realizado_vs_orcado,
+            'Realizado': tabela_realizado,
+            'BI Detalhado': tabela_bi
+        }, f"relatorio_beneficios_{args.mes}_{datetime.now():%Y%m%d}", args)
+
+    if args.snapshot:
+        with cronometro.etapa("Snapshot Parquet"):
+            main.salvar_snapshot(
+                f"beneficios_{args.mes}_{datetime.now():%Y%m%d_%H%M%S}",
+                consolidado=realizado_vs_orcado,
+                realizado=tabela_realizado,
+                bi=tabela_bi
+            )
+
+    cronometro.resumo()
+    return 0
+
+
+def executar_lote(args):
+    cronometro = Cronometro(args.detalhado)
+
+    arquivos = {}
+    for item in args.realizado:
+        mes, _, caminho = item.partition('=')
+        if mes not in MESES or not caminho:
+            print(f"Formato inválido em --realizado: {item} (use MES=arquivo.xlsx)", file=sys.stderr)
+            return 2
+        arquivos[mes] = caminho
+
+    with cronometro.etapa(f"Processamento de {len(arquivos)} mês(es)"):
+        relatorio, erros = main.gerar_relatorios_lote(
+            arquivos, args.orcado, args.ednaldo, ano=args.ano, max_processos=args.processos
+        )
+
+    for mes, log in erros.items():
+        print(f"Mês {mes}:", file=sys.stderr)
+        exibir_erro(log)
+
+    if relatorio is None:
+        return 1
+
+    ano = args.ano or f"{datetime.now():%Y}"
+    with cronometro.etapa(f"Exportação ({args.formato})"):
+        exportar({'Consolidado': relatorio}, f"relatorio_beneficios_{ano}_{min(arquivos)}a{max(arquivos)}", args)
+
+    if args.snapshot:
+        with cronometro.etapa("Snapshot Parquet"):
+            main.salvar_snapshot(
+                f"lote_{ano}_{datetime.now():%Y%m%d_%H%M%S}",
+                consolidado=relatorio
+            )
+
+    cronometro.resumo()
+    return 1 if erros else 0
+
+
+def executar_folha(args):
+    cronometro = Cronometro(args.detalhado)
+
+    with cronometro.etapa("Leitura da folha"):
+        orcamento, realizado = main.estruturar_dados(args.arquivo)
+
+    with cronometro.etapa("Consolidação orçado x realizado"):
+        relatorio = main.consolidar_orcado_realizado(orcamento, realizado)
+
+    with cronometro.etapa(f"Exportação ({args.formato})"):
+        exportar({'Consolidado': relatorio}, f"trabalhista_{datetime.now():%Y%m%d}", args)
+
+    if args.snapshot:
+        with cronometro.etapa("Snapshot Parquet"):
+            main.salvar_snapshot(f"trabalhista_{datetime.now():%Y%m%d_%H%M%S}", consolidado=relatorio)
+
+    cronometro.resumo()
+    return 0
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Processamento dos relatórios de benefícios e da folha")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument('--saida', default='.', help="Pasta onde os arquivos gerados são gravados")
+    comum.add_argument('--formato', choices=['xlsx', 'csv', 'parquet'], default='xlsx',
+                       help="Formato dos arquivos gerados; CSV e Parquet gravam um arquivo por tabela")
+    comum.add_argument('--snapshot', action='store_true', help="Também salva um snapshot Parquet do resultado")
+    comum.add_argument('--dividir-arquivos', action='store_true',
+                       help="Tabelas acima do limite de linhas do Excel continuam em outros arquivos, e não em outras abas")
+    comum.add_argument('-v', '--detalhado', action='store_true', help="Mostra o tempo de cada passo intermediário")
+
+    beneficios = subcomandos.add_parser('beneficios', parents=[comum], help="Relatório de benefícios")
+    beneficios.add_argument('--realizado', required=True, help="Planilha de benefícios (realizado)")
+    beneficios.add_argument('--orcado', required=True, help="Planilha de orçamento")
+    beneficios.add_argument('--bi', required=True, help="Planilha detalhada do BI")
+    beneficios.add_argument('--mes', required=True, choices=MESES, help="Mês de análise (01 a 12)")
+    beneficios.add_argument('--ednaldo', action='store_true', help="Ativa o modo Ednaldo")
+    beneficios.add_argument('--paralelo', action='store_true', help="Lê as abas em processos separados")
+    beneficios.set_defaults(executar=executar_beneficios)
+
+    lote = subcomandos.add_parser('lote', parents=[comum], help="Relatório de benefícios de vários meses")
+    lote.add_argument('--realizado', required=True, nargs='+', metavar='MES=ARQUIVO',
+                      help="Planilha de benefícios de cada mês, por exemplo 01=janeiro.xlsx 02=fevereiro.xlsx")
+    lote.add_argument('--orcado', required=True, help="Planilha de orçamento (lida uma única vez)")
+    lote.add_argument('--ano', help="Ano do orçamento (padrão: ano atual)")
+    lote.add_argument('--ednaldo', action='store_true', help="Ativa o modo Ednaldo")
+    lote.add_argument('--processos', type=int, help="Número máximo de processos (1 = sem paralelismo)")
+    lote.set_defaults(executar=executar_lote)
+
+    folha = subcomandos.add_parser('folha', parents=[comum], help="Relatório da folha de pagamento")
+    folha.add_argument('--arquivo', required=True, help="Planilha da folha com as abas REALIZADO e ORCADO")
+    folha.set_defaults(executar=executar_folha)
+
+    return parser
+
+
+if __name__ == '__main__':
+    argumentos = criar_parser().parse_args()
+    sys.exit(argumentos.executar(argumentos))
@@ -0,0 +1 @@
+# Coloca a raiz do projeto no sys.path para os testes importarem main, utilitarios etc.
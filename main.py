@@ -1,22 +1,98 @@
 import pandas as pd
+import numpy as np
 import unicodedata
 import re
+import io
+import os
+import importlib.util
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from cache_arquivos import em_cache
+from moeda import para_centavos, para_reais
+
+# Engine usado na leitura dos arquivos Excel. None = automático (calamine se instalado, senão openpyxl)
+MOTOR_EXCEL = None
+
+# Processos auxiliares (só pela linha de comando) são iniciados com spawn, sem herdar
+# travas de outras threads. Não use a partir das páginas: sob o streamlit run, o spawn
+# reexecuta o script da página em cada processo
+CONTEXTO_PROCESSOS = multiprocessing.get_context('spawn')
+
+# Pasta onde ficam os snapshots Parquet dos relatórios consolidados
+DIRETORIO_SNAPSHOTS = 'snapshots'
+
+# Exportação para Excel: linhas de dados por aba (1.048.576 menos o cabeçalho),
+# linhas convertidas por vez e formato das colunas de valores
+LIMITE_LINHAS_EXCEL = 1_048_575
+TAMANHO_BLOCO_EXCEL = 50_000
+FORMATO_MOEDA = '"R$" #,##0.00'
+
+# Formato aceito por float(): sinal, dígitos (com _ entre eles), ponto decimal, expoente, inf/nan
+PADRAO_NUMERO = r'^[+-]?((\d(_?\d)*(\.(\d(_?\d)*)?)?|\.\d(_?\d)*)([eE][+-]?\d(_?\d)*)?|(?i:inf|infinity|nan))$'
+
+def _numeros_validos(texto):
+    # Converte só o que tem formato de número (mesmo arredondamento de float()); o resto vira NaN
+    validos = pc.match_substring_regex(texto, PADRAO_NUMERO)
+    numeros = pc.if_else(validos, pc.replace_substring(texto, '_', ''), pa.scalar(None, pa.string()))
+    return pc.cast(numeros, pa.float64()).to_numpy(zero_copy_only=False, writable=True)
+
+def converter_coluna_float(coluna):
+    """
+    Converte uma coluna de valores (texto ou número) para float.
+    Vazio/NaN vira 0.0; tenta o número direto, depois com vírgula decimal e, por fim,
+    removendo símbolos. Valores que não puderem ser convertidos ficam como NaN.
+    """
+    etapas = [
+        lambda texto: pc.replace_substring(texto, ',', '.'),
+        lambda texto: pc.replace_substring(pc.replace_substring_regex(texto, r'[^0-9.,]', ''), ',', '.'),
+    ]
 
-def converter_para_float(valor):
-    if pd.isna(valor) or valor == '':
-        return 0.0
     try:
-        return float(valor)
-    except (ValueError, TypeError):
-        try:
-            return float(str(valor).replace(',', '.'))
-        except (ValueError, TypeError):
-            try:
-                valor_limpo = re.sub(r'[^\d.,]', '', str(valor))
-                return float(valor_limpo.replace(',', '.'))
-            except:
-                return None
+        texto = pa.array(coluna.to_numpy(), type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Coluna com valores não textuais (ex.: números já convertidos)
+        texto = pa.array(coluna.astype(str).mask(coluna.isna()).to_numpy(), type=pa.string(), from_pandas=True)
+    vazios = pc.or_kleene(pc.is_null(texto), pc.equal(texto, '')).to_numpy(zero_copy_only=False)
+    texto = pc.utf8_trim_whitespace(texto)
+
+    valores = _numeros_validos(texto)
+    for etapa in etapas:
+        pendentes = np.flatnonzero(np.isnan(valores) & ~vazios)
+        if len(pendentes) == 0:
+            break
+        valores[pendentes] = _numeros_validos(etapa(texto.take(pendentes)))
+
+    valores[vazios] = 0.0
+    return pd.Series(valores, index=coluna.index)
+
+def motor_excel():
+    """
+    Retorna o engine de leitura de Excel: MOTOR_EXCEL, se definido; 'calamine' quando
+    o pacote python-calamine estiver instalado; caso contrário, 'openpyxl'.
+    """
+    if MOTOR_EXCEL:
+        return MOTOR_EXCEL
+    return 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+
+def abrir_excel(caminho_arquivo):
+    return pd.ExcelFile(caminho_arquivo, engine=motor_excel())
+
+def ler_excel(caminho_arquivo, **kwargs):
+    """
+    Ponto único de leitura de planilhas: equivalente a pd.read_excel, usando o engine de motor_excel.
+    Aceita caminho, arquivo enviado pelo Streamlit ou um pd.ExcelFile já aberto por abrir_excel.
+    """
+    if not isinstance(caminho_arquivo, pd.ExcelFile):
+        kwargs['engine'] = motor_excel()
+    return pd.read_excel(caminho_arquivo, **kwargs)
 
 def limpar_texto(texto, nome_coluna=False):
     texto = unicodedata.normalize('NFKD', str(texto))
@@ -27,7 +103,65 @@ def limpar_texto(texto, nome_coluna=False):
         texto = re.sub(r'[^\w\s]', '', texto)
     return re.sub(r'\s+', '', texto)
 
-def carregar_excel(caminho_arquivo, modo_ednaldo=False):
+def carregar_aba(arquivo_excel, nome_aba, colunas_necessarias):
+    """
+    Carrega uma aba de benefícios com as colunas necessárias, já renomeadas.
+    Retorna (DataFrame ou None, informações para o log de carregamento da aba).
+    """
+    try:
+        # Lê apenas o cabeçalho para resolver as colunas antes da leitura completa
+        cabecalho = ler_excel(arquivo_excel, sheet_name=nome_aba, dtype=str, nrows=0)
+        colunas_encontradas = cabecalho.columns.tolist()
+
+        mapeamento = {}
+        faltantes = []
+
+        for col in colunas_necessarias:
+            col_limpa = limpar_texto(col).upper()
+            encontrou = False
+            for col_existente in colunas_encontradas:
+                if col_limpa in limpar_texto(col_existente).upper():
+                    mapeamento[col_existente] = col
+                    encontrou = True
+                    break
+            if not encontrou:
+                faltantes.append(col)
+
+        if faltantes:
+            return None, {'motivo': f"Colunas faltantes: {', '.join(faltantes)}"}
+
+        colunas_para_usar = list(mapeamento.keys())
+        df = ler_excel(arquivo_excel, sheet_name=nome_aba, usecols=colunas_para_usar, dtype=str)
+        df = df.rename(columns=mapeamento)
+
+        return df, {'status': 'Carregada com sucesso', 'linhas': len(df), 'colunas': list(df.columns)}
+    except Exception as e:
+        return None, {'motivo': f"Erro: {str(e)}"}
+
+def _carregar_aba_em_processo(conteudo, motor, nome_aba, colunas_necessarias):
+    # Executado em um processo separado: cada worker abre sua própria cópia do arquivo
+    fonte = io.BytesIO(conteudo) if isinstance(conteudo, bytes) else conteudo
+    return carregar_aba(pd.ExcelFile(fonte, engine=motor), nome_aba, colunas_necessarias)
+
+def conteudo_arquivo(caminho_arquivo):
+    """
+    Retorna os bytes de um arquivo enviado (UploadedFile/BytesIO) ou o próprio caminho,
+    em um formato que pode ser enviado para outros processos.
+    """
+    if hasattr(caminho_arquivo, 'getvalue'):
+        return caminho_arquivo.getvalue()
+    if hasattr(caminho_arquivo, 'read'):
+        caminho_arquivo.seek(0)
+        return caminho_arquivo.read()
+    return caminho_arquivo
+
+@em_cache(ignorar=('paralelo', 'max_processos'), validar=lambda resultado: verificar_resultado(resultado))
+def carregar_excel(caminho_arquivo, modo_ednaldo=False, paralelo=False, max_processos=None):
+    """
+    Carrega as abas de benefícios reconhecidas do arquivo.
+    Com paralelo=True, cada aba é lida em um processo separado (até max_processos ao mesmo tempo);
+    disponível só pela linha de comando (cli.py --paralelo), veja CONTEXTO_PROCESSOS.
+    """
     tipos_planilhas = ["UNIMED", "CLIN", "VA", "SV"]
     if modo_ednaldo:
         tipos_planilhas.append("SV2")
@@ -43,8 +177,9 @@ def carregar_excel(caminho_arquivo, modo_ednaldo=False):
     log_carregamento = {}
     
     try:
-        arquivo_excel = pd.ExcelFile(caminho_arquivo)
+        arquivo_excel = abrir_excel(caminho_arquivo)
         dados_planilhas = {}
+        abas_reconhecidas = []
 
         for nome_aba in arquivo_excel.sheet_names:
             log_carregamento[nome_aba] = {'status': 'Não carregada'}
@@ -58,39 +193,26 @@ def carregar_excel(caminho_arquivo, modo_ednaldo=False):
                 continue
 
             log_carregamento[nome_aba]['tipo_planilha'] = tipo_identificado
-
-            try:
-                df_completo = pd.read_excel(arquivo_excel, sheet_name=nome_aba, dtype=str)
-                colunas_encontradas = df_completo.columns.tolist()
-
-                mapeamento = {}
-                faltantes = []
-
-                for col in colunas_necessarias[tipo_identificado]:
-                    col_limpa = limpar_texto(col).upper()
-                    encontrou = False
-                    for col_existente in colunas_encontradas:
-                        if col_limpa in limpar_texto(col_existente).upper():
-                            mapeamento[col_existente] = col
-                            encontrou = True
-                            break
-                    if not encontrou:
-                        faltantes.append(col)
-
-                if faltantes:
-                    log_carregamento[nome_aba]['motivo'] = f"Colunas faltantes: {', '.join(faltantes)}"
-                    continue
-
-                colunas_para_usar = list(mapeamento.keys())
-                df = pd.read_excel(arquivo_excel, sheet_name=nome_aba, usecols=colunas_para_usar, dtype=str)
-                df = df.rename(columns=mapeamento)
-
+            abas_reconhecidas.append((nome_aba, tipo_identificado))
+
+        if paralelo and len(abas_reconhecidas) > 1:
+            conteudo = conteudo_arquivo(caminho_arquivo)
+            with ProcessPoolExecutor(max_workers=max_processos, mp_context=CONTEXTO_PROCESSOS) as executor:
+                futuros = [
+                    executor.submit(_carregar_aba_em_processo, conteudo, motor_excel(), nome_aba, colunas_necessarias[tipo])
+                    for nome_aba, tipo in abas_reconhecidas
+                ]
+                resultados = [futuro.result() for futuro in futuros]
+        else:
+            resultados = [
+                carregar_aba(arquivo_excel, nome_aba, colunas_necessarias[tipo])
+                for nome_aba, tipo in abas_reconhecidas
+            ]
+
+        for (nome_aba, tipo_identificado), (df, log_aba) in zip(abas_reconhecidas, resultados):
+            log_carregamento[nome_aba].update(log_aba)
+            if df is not None:
                 dados_planilhas[tipo_identificado] = df
-                log_carregamento[nome_aba]['status'] = 'Carregada com sucesso'
-                log_carregamento[nome_aba]['linhas'] = len(df)
-                log_carregamento[nome_aba]['colunas'] = list(df.columns)
-            except Exception as e:
-                log_carregamento[nome_aba]['motivo'] = f"Erro: {str(e)}"
 
         planilhas_encontradas = [log_carregamento[p]['tipo_planilha'] for p in log_carregamento if 'tipo_planilha' in log_carregamento[p]]
         nao_encontradas = [p for p in tipos_planilhas if p not in planilhas_encontradas]
@@ -107,84 +229,162 @@ def carregar_excel(caminho_arquivo, modo_ednaldo=False):
         log_carregamento['erro_geral'] = f"Erro: {e}"
         return log_carregamento
 
+def normalizar_cpf(coluna):
+    """
+    Versão vetorizada de limpar_texto para colunas de CPF: aplica NFKD e remove tudo que
+    não for letra, número ou '_' (acentos, pontuação e espaços). Valores ausentes continuam NaN.
+    """
+    ausentes = coluna.isna()
+    texto = pa.array(coluna.astype(str).to_numpy(), type=pa.string())
+    texto = pc.replace_substring_regex(pc.utf8_normalize(texto, 'NFKD'), r'[^\pL\pN_]', '')
+    return pd.Series(texto.to_numpy(zero_copy_only=False), index=coluna.index).mask(ausentes)
+
+def normalizar_cpfs(dados_planilhas):
+    """
+    Normaliza uma única vez as colunas CPFTITULAR e CPFBENEFICIARIO de cada aba.
+    As etapas seguintes (extrair_cpfs_unicos, extrair_nomes_por_cpf e juntar_tabelas)
+    usam essas colunas já limpas.
+    """
+    return {
+        tipo: df.assign(**{
+            coluna: normalizar_cpf(df[coluna])
+            for coluna in ['CPFTITULAR', 'CPFBENEFICIARIO'] if coluna in df.columns
+        })
+        for tipo, df in dados_planilhas.items()
+    }
+
 def extrair_cpfs_unicos(dados_planilhas):
     lista_cpfs = []
     for df in dados_planilhas.values():
-        for coluna in df.columns:
-            if 'CPFTITULAR' in coluna:
-                cpfs = df[coluna].apply(lambda x: limpar_texto(str(x)) if pd.notna(x) else None)
-                cpfs_validos = [cpf for cpf in cpfs.dropna().tolist() if cpf and len(cpf) >= 11]
-                lista_cpfs.extend(cpfs_validos)
-    return list(set(lista_cpfs))
+        if 'CPFTITULAR' in df.columns:
+            cpfs = df['CPFTITULAR'].dropna()
+            lista_cpfs.append(cpfs[cpfs.str.len() >= 11])
+    if not lista_cpfs:
+        return []
+    return pd.unique(pd.concat(lista_cpfs)).tolist()
 
 def extrair_nomes_por_cpf(dados_planilhas):
     """
-    Extrai os nomes dos beneficiários usando CPFTITULAR como chave
+    Extrai os nomes dos beneficiários usando CPFTITULAR como chave.
+    Retorna uma Series indexada pelo CPF, pronta para .map; se o CPF aparecer
+    mais de uma vez, mantém o primeiro nome encontrado (na ordem das abas).
     """
-    nomes_por_cpf = {}
-    
-    for df in dados_planilhas.values():
-        if 'CPFTITULAR' in df.columns and 'NOMETITULAR' in df.columns:
-            for idx, row in df.iterrows():
-                cpf_titular = limpar_texto(str(row['CPFTITULAR'])) if pd.notna(row['CPFTITULAR']) else None
-                nome_beneficiario = str(row['NOMETITULAR']).strip() if pd.notna(row['NOMETITULAR']) else None
-                
-                if cpf_titular and nome_beneficiario and len(cpf_titular) >= 11:
-                    # Se já existe um nome para este CPF, mantém o primeiro encontrado
-                    if cpf_titular not in nomes_por_cpf:
-                        nomes_por_cpf[cpf_titular] = nome_beneficiario
-    
-    return nomes_por_cpf
+    partes = [
+        df[['CPFTITULAR', 'NOMETITULAR']]
+        for df in dados_planilhas.values()
+        if 'CPFTITULAR' in df.columns and 'NOMETITULAR' in df.columns
+    ]
+    if not partes:
+        return pd.Series(dtype=object, name='NOMETITULAR')
+
+    pares = pd.concat(partes, ignore_index=True).dropna()
+    pares['NOMETITULAR'] = pares['NOMETITULAR'].astype(str).str.strip()
+    pares = pares[(pares['CPFTITULAR'].str.len() >= 11) & (pares['NOMETITULAR'] != '')]
+
+    return (
+        pares.drop_duplicates('CPFTITULAR')
+        .set_index('CPFTITULAR')['NOMETITULAR']
+        .rename_axis('CPF')
+    )
 
 def processar_tabela(df):
+    """
+    Converte as colunas de valor (VALOR e as seguintes) e calcula o FINAL.
+    Retorna (tabela, valores_invalidos), com a quantidade de células não numéricas por
+    coluna, que ficam NaN e deixam o FINAL da linha vazio.
+    """
     tabela = df.copy()
     if 'VALOR' not in tabela.columns:
-        return tabela
+        return tabela, {}
 
     indice_valor = tabela.columns.get_loc('VALOR')
     colunas_numericas = tabela.columns[indice_valor:]
 
+    valores_invalidos = {}
     for coluna in colunas_numericas:
-        tabela[coluna] = tabela[coluna].apply(converter_para_float)
-
-    tabela['FINAL'] = tabela['VALOR']
+        tabela[coluna] = converter_coluna_float(tabela[coluna])
+        quantidade_invalidos = int(tabela[coluna].isna().sum())
+        if quantidade_invalidos:
+            valores_invalidos[coluna] = quantidade_invalidos
+
+    # Subtração dos descontos em centavos inteiros; o FINAL já sai arredondado ao centavo.
+    # Como na subtração em float, uma célula não numérica deixa o FINAL da linha vazio
+    final = para_centavos(tabela['VALOR'])
     for coluna in colunas_numericas[1:]:
-        tabela['FINAL'] -= tabela[coluna]
+        final -= para_centavos(tabela[coluna])
+    tabela['FINAL'] = para_reais(final).where(np.isfinite(tabela[colunas_numericas]).all(axis=1))
 
-    return tabela
+    return tabela, valores_invalidos
 
 def processar_completo(planilhas, modo_ednaldo=False):
+    """
+    Aplica processar_tabela às abas de cada benefício.
+    Retorna (tabelas, valores_invalidos): as tabelas na ordem UNIMED, VA, CLIN, SV (e SV2
+    no modo Ednaldo) e {aba: {coluna: quantidade}} só das abas com células não numéricas.
+    """
     chaves = ['UNIMED', 'VA', 'CLIN', 'SV']
     if modo_ednaldo:
         chaves.append('SV2')
-    return tuple(processar_tabela(planilhas.get(chave)) for chave in chaves)
+    tabelas = []
+    valores_invalidos = {}
+    for chave in chaves:
+        tabela, invalidos = processar_tabela(planilhas.get(chave))
+        tabelas.append(tabela)
+        if invalidos:
+            valores_invalidos[chave] = invalidos
+    return tuple(tabelas), valores_invalidos
+
+def _codigos_filial(textos):
+    """
+    Extrai, de uma vez, o código de cada texto de filial distinto ({texto: código ou None}).
+    """
+    textos = pd.Series(sorted(set(textos)), dtype=object)
+    if textos.empty:
+        return {}
+    codigos = textos.str.split(' - ').str[0].str.extract(r'(\d+)', expand=False).str.zfill(2)
+    return dict(zip(textos, codigos.astype(object).where(codigos.notna(), None)))
 
-def juntar_tabelas(cpfs, unimed, va, clin, sv, sv2=None, modo_ednaldo=False):
-    tabela_mestre = pd.DataFrame({'CPF': cpfs})
+def extrair_codigo_filial(coluna, multiplas=False):
+    """
+    Converte uma coluna de filial ('02 - NOME') no código com dois dígitos ('02').
+    A regex roda só uma vez por texto distinto; textos sem número viram None e
+    valores que não são texto são mantidos.
+    Com multiplas=True, cada célula pode ter várias filiais separadas por ", "
+    (SV e SV2 agrupados no modo Ednaldo), e os códigos são unidos da mesma forma.
+    """
+    textos = [valor for valor in pd.unique(coluna) if isinstance(valor, str)]
+    if multiplas:
+        partes = {texto: texto.split(', ') for texto in textos}
+        codigos_partes = _codigos_filial(parte for lista in partes.values() for parte in lista)
+        codigos = {
+            texto: ', '.join(codigos_partes[parte] for parte in lista if codigos_partes[parte])
+            for texto, lista in partes.items()
+        }
+    else:
+        codigos = _codigos_filial(textos)
 
-    def formatar_filial(valor):
-        if pd.isna(valor) or not isinstance(valor, str):
-            return valor
-        valor = valor.split(' - ')[0]
-        numeros = re.findall(r'\d+', valor)
-        return str(numeros[0].zfill(2)) if numeros else None
+    return coluna.map(codigos).where(coluna.isin(textos), coluna)
 
-    def limpar_cpf(cpf):
-        return limpar_texto(str(cpf)) if pd.notna(cpf) else None
+def juntar_tabelas(cpfs, unimed, va, clin, sv, sv2=None, modo_ednaldo=False):
+    """
+    Junta os valores realizados de cada benefício em uma tabela por CPF.
+    Retorna (tabela, fanout), com fanout = {benefício: {cpf: linhas}} dos CPFs com mais
+    de uma linha no mesmo benefício.
+    """
+    tabela_mestre = pd.DataFrame({'CPF': cpfs})
 
     def preparar_tabela(tabela, coluna_chave, nome_df):
         if tabela is None or coluna_chave not in tabela.columns or 'FINAL' not in tabela.columns or 'FILIAL' not in tabela.columns:
             return pd.DataFrame()
+        # A coluna de CPF já vem normalizada por normalizar_cpfs
         temp = tabela[[coluna_chave, 'FINAL', 'FILIAL', 'CCFORMATADO']].copy()
-        temp[coluna_chave] = temp[coluna_chave].apply(limpar_cpf)
         temp = temp.rename(columns={
             coluna_chave: 'CPF',
             'FINAL': f'realizado_{nome_df}',
             'FILIAL': f'filial_realizada_{nome_df}',
             'CCFORMATADO': f'CC_realizado_{nome_df}'
         })
-        temp[f'filial_realizada_{nome_df}'] = temp[f'filial_realizada_{nome_df}'].apply(formatar_filial)
-        temp[f'realizado_{nome_df}'] = temp[f'realizado_{nome_df}'].round(2)
+        temp[f'filial_realizada_{nome_df}'] = extrair_codigo_filial(temp[f'filial_realizada_{nome_df}'])
         return temp
 
     df_unimed = preparar_tabela(unimed, 'CPFBENEFICIARIO', 'unimed')
@@ -200,26 +400,55 @@ def juntar_tabelas(cpfs, unimed, va, clin, sv, sv2=None, modo_ednaldo=False):
             'CC_realizado_sv2': 'CC_realizado_sv'
         })
         df_sv = pd.concat([df_sv, df_sv2], ignore_index=True)
+        df_sv['realizado_sv'] = para_centavos(df_sv['realizado_sv'])
         df_sv = df_sv.groupby('CPF', as_index=False).agg({
             'realizado_sv': 'sum',
             'filial_realizada_sv': lambda x: ", ".join(sorted(set(x.dropna()))),
             'CC_realizado_sv': lambda x: ", ".join(sorted(set(x.dropna())))
         })
+        df_sv['realizado_sv'] = para_reais(df_sv['realizado_sv'])
 
         if not df_sv.empty:
-            df_sv['filial_realizada_sv'] = df_sv['filial_realizada_sv'].apply(
-                lambda x: ", ".join(formatar_filial(p) for p in x.split(", ")) if isinstance(x, str) else x)
-            df_sv['CC_realizado_sv'] = df_sv['CC_realizado_sv'].apply(
-                lambda x: ", ".join(formatar_filial(p) for p in x.split(", ")) if isinstance(x, str) else x)
+            df_sv['filial_realizada_sv'] = extrair_codigo_filial(df_sv['filial_realizada_sv'], multiplas=True)
+            df_sv['CC_realizado_sv'] = extrair_codigo_filial(df_sv['CC_realizado_sv'], multiplas=True)
 
-    for df_individual in [df_unimed, df_va, df_clin, df_sv]:
-        if not df_individual.empty:
-            tabela_mestre = tabela_mestre.merge(df_individual, on='CPF', how='left')
+    tabelas = {
+        nome: df_individual[df_individual['CPF'].isin(cpfs)].set_index('CPF')
+        for nome, df_individual in zip(['UNIMED', 'VA', 'CLIN', 'SV'], [df_unimed, df_va, df_clin, df_sv])
+        if not df_individual.empty
+    }
 
-    return tabela_mestre.sort_values('CPF').reset_index(drop=True)
+    # CPFs com mais de uma linha no mesmo benefício multiplicam as linhas da tabela final
+    fanout = {}
+    for nome, tabela in tabelas.items():
+        contagem = tabela.index.value_counts()
+        repetidos = contagem[contagem > 1]
+        if not repetidos.empty:
+            fanout[nome] = repetidos.sort_index().to_dict()
+
+    # Tabelas com um CPF por linha são alinhadas de uma vez; as demais entram depois,
+    # uma a uma, reproduzindo as linhas repetidas de um left merge
+    tabela_mestre = tabela_mestre.set_index('CPF')
+    unicas = [tabela for nome, tabela in tabelas.items() if nome not in fanout]
+    if unicas:
+        tabela_mestre = tabela_mestre.join(unicas, how='left')
+    for nome in fanout:
+        tabela_mestre = tabela_mestre.join(tabelas[nome], how='left')
+
+    colunas = ['CPF'] + [coluna for tabela in tabelas.values() for coluna in tabela.columns]
+    tabela_mestre = (
+        tabela_mestre.reset_index()[colunas]
+        .sort_values('CPF', kind='stable')
+        .reset_index(drop=True)
+    )
+    return tabela_mestre, fanout
 
-def carregar_orcamento(caminho_orcamento, mes_analise):
-    recorrentes = pd.read_excel(caminho_orcamento, 
+@em_cache()
+def ler_orcamento(caminho_orcamento):
+    """
+    Lê o arquivo de orçamento completo (todos os meses), com CPF e FILIAL padronizados.
+    """
+    recorrentes = ler_excel(caminho_orcamento, 
         dtype={
             'CPF': str, 'ANOMES': str, 'FILIAL': str,
             'VALE ALIMENTACAO': float, 'ASSISTENCIA MEDICA': float,
@@ -231,9 +460,13 @@ def carregar_orcamento(caminho_orcamento, mes_analise):
 
     recorrentes['CPF'] = recorrentes['CPF'].fillna('').str.replace('.', '').str.replace('-', '').str.zfill(11)
     recorrentes['FILIAL'] = recorrentes['FILIAL'].str.zfill(2)
+
+    return recorrentes
+
+def carregar_orcamento(caminho_orcamento, mes_analise):
+    recorrentes = ler_orcamento(caminho_orcamento)
     ano_mes = f"{datetime.now().strftime('%Y')}{mes_analise}"
-    recorrentes = recorrentes[recorrentes['ANOMES'] == ano_mes]
-    recorrentes.drop(columns=['ANOMES'], inplace=True)
+    recorrentes = recorrentes[recorrentes['ANOMES'] == ano_mes].drop(columns=['ANOMES'])
 
     return recorrentes
 
@@ -278,125 +511,251 @@ def verificar_resultado(retorno):
     primeiro_valor = retorno[primeira_chave]
     return hasattr(primeiro_valor, 'iloc') and hasattr(primeiro_valor, 'columns')
 
-def gerar_relatorio(caminho_beneficios: str, caminho_orcamento: str, modo_ednaldo=False, mes_analise: str = None, progresso=None):
+def preparar_beneficios(caminho_beneficios, modo_ednaldo=False, progresso=None, paralelo=False):
+    """
+    Lê a planilha de benefícios uma única vez e consolida os valores realizados por CPF.
+    O resultado é compartilhado por gerar_relatorio e gerar_comparacao_bi, evitando
+    reprocessar o mesmo arquivo em cada relatório.
+
+    Retorna um dicionário com as chaves 'planilhas' (abas carregadas ou log de erro),
+    'consolidado' (tabela por CPF com NOMETITULAR, ou None em caso de erro), 'modo_ednaldo',
+    'valores_invalidos' ({aba: {coluna: quantidade}} de células não numéricas) e 'fanout'
+    ({benefício: {cpf: linhas}} dos CPFs com mais de uma linha no mesmo benefício).
+    """
     def atualizar_progresso(porc, mensagem=""):
         if progresso:
             progresso(porc, mensagem)
 
     atualizar_progresso(0, "Carregando arquivos...")
-    planilhas = carregar_excel(caminho_beneficios, modo_ednaldo)
+    planilhas = carregar_excel(caminho_beneficios, modo_ednaldo, paralelo=paralelo)
     atualizar_progresso(20, "Arquivos carregados")
 
+    if verificar_resultado(planilhas):
+        planilhas = normalizar_cpfs(planilhas)
+
+    beneficios = {
+        'planilhas': planilhas, 'consolidado': None, 'modo_ednaldo': modo_ednaldo,
+        'valores_invalidos': {}, 'fanout': {}
+    }
+
     if verificar_resultado(planilhas):
         cpfs = extrair_cpfs_unicos(planilhas)
-        nomes_por_cpf = extrair_nomes_por_cpf(planilhas)  # Nova função para extrair nomes
+        nomes_por_cpf = extrair_nomes_por_cpf(planilhas)
         atualizar_progresso(40, "CPFs e nomes extraídos")
 
-        recorrentes = carregar_orcamento(caminho_orcamento, mes_analise)
-        atualizar_progresso(60, "Recorrentes carregados")
-
         if modo_ednaldo:
-            unimed, va, clin, sv, sv2 = processar_completo(planilhas, modo_ednaldo=True)
+            (unimed, va, clin, sv, sv2), valores_invalidos = processar_completo(planilhas, modo_ednaldo=True)
         else:
-            unimed, va, clin, sv = processar_completo(planilhas)
+            (unimed, va, clin, sv), valores_invalidos = processar_completo(planilhas)
             sv2 = None
 
+        beneficios['valores_invalidos'] = valores_invalidos
+
         atualizar_progresso(80, "Dados processados")
 
-        tabela_final = juntar_tabelas(cpfs, unimed, va, clin, sv, sv2, modo_ednaldo)
-        
+        tabela_final, beneficios['fanout'] = juntar_tabelas(cpfs, unimed, va, clin, sv, sv2, modo_ednaldo)
+
         # Adicionar os nomes dos beneficiários na tabela final
         tabela_final['NOMETITULAR'] = tabela_final['CPF'].map(nomes_por_cpf)
-        
-        tabela_final = juntar_recorrentes(tabela_final, recorrentes)
-        
-        tabela_final[['CC_realizado_va', 'CC_realizado_unimed', 'CC_realizado_sv', 'CC_realizado_clin']] = tabela_final[['CC_realizado_va', 'CC_realizado_unimed', 'CC_realizado_sv', 'CC_realizado_clin']].fillna('00000000')
-        tabela_final[['filial_realizada_va', 'filial_realizada_unimed', 'filial_realizada_sv', 'filial_realizada_clin']] = tabela_final[['filial_realizada_va', 'filial_realizada_unimed', 'filial_realizada_sv', 'filial_realizada_clin']].fillna('00')
-        tabela_final['NOMETITULAR'] = tabela_final['NOMETITULAR'].fillna('')
-        tabela_final = tabela_final.fillna(0)
-        atualizar_progresso(100, "Relatório finalizado")
-        return tabela_final
-        
-    else:
-        return planilhas
 
-def gerar_comparacao_bi(caminho_beneficios: str, caminho_bi: str, modo_ednaldo=False, progresso=None):
+        beneficios['consolidado'] = tabela_final
+        atualizar_progresso(100, "Dados consolidados")
+
+    return beneficios
+
+def gerar_relatorio(beneficios: dict, caminho_orcamento: str, mes_analise: str = None, progresso=None, compacto=False):
     def atualizar_progresso(porc, mensagem=""):
         if progresso:
             progresso(porc, mensagem)
 
-    atualizar_progresso(0, "Carregando arquivos...")
-    planilhas = carregar_excel(caminho_beneficios, modo_ednaldo)
-    atualizar_progresso(20, "Arquivos carregados")
+    if beneficios['consolidado'] is None:
+        return beneficios['planilhas']
 
-    resultado_bi = None
+    atualizar_progresso(0, "Carregando recorrentes...")
+    recorrentes = carregar_orcamento(caminho_orcamento, mes_analise)
+    atualizar_progresso(60, "Recorrentes carregados")
 
-    if verificar_resultado(planilhas):
-        cpfs = extrair_cpfs_unicos(planilhas)
-        nomes_por_cpf = extrair_nomes_por_cpf(planilhas)  # Adicionar nomes também aqui
-        atualizar_progresso(40, "CPFs e nomes extraídos")
+    tabela_final = montar_relatorio(beneficios['consolidado'], recorrentes)
+    if compacto:
+        tabela_final = compactar_relatorio(tabela_final)
+    atualizar_progresso(100, "Relatório finalizado")
+    return tabela_final
 
-        if modo_ednaldo:
-            unimed, va, clin, sv, sv2 = processar_completo(planilhas, modo_ednaldo=True)
+# Colunas do relatório consolidado por tipo: códigos de filial, de centro de custo e valores
+COLUNAS_FILIAL = ['previsto_filial', 'filial_realizada_va', 'filial_realizada_unimed', 'filial_realizada_clin', 'filial_realizada_sv']
+COLUNAS_CC = ['CC_realizado_va', 'CC_realizado_unimed', 'CC_realizado_clin', 'CC_realizado_sv']
+COLUNAS_VALOR = [
+    f'{tipo}_{sufixo}' for sufixo in ['va', 'unimed', 'clin', 'sv'] for tipo in ['previsto', 'realizado']
+]
+
+def montar_relatorio(consolidado, recorrentes):
+    """
+    Junta o consolidado de benefícios (preparar_beneficios) com o orçamento de um mês
+    e preenche os valores ausentes.
+    """
+    tabela_final = juntar_recorrentes(consolidado, recorrentes)
+
+    tabela_final[COLUNAS_CC] = tabela_final[COLUNAS_CC].fillna('00000000')
+    tabela_final[COLUNAS_FILIAL] = tabela_final[COLUNAS_FILIAL].fillna('00')
+    tabela_final['NOMETITULAR'] = tabela_final['NOMETITULAR'].fillna('')
+    # Só as colunas de valor recebem 0; texto ausente não deve virar o número 0
+    tabela_final[COLUNAS_VALOR] = tabela_final[COLUNAS_VALOR].fillna(0)
+    return tabela_final
+
+def compactar_relatorio(tabela):
+    """
+    Converte uma tabela consolidada (gerar_relatorio ou a tabela realizada de
+    gerar_comparacao_bi) para o esquema compacto, que ocupa cerca de 15% da memória
+    (por volta de 110 bytes por linha, contra 750 com colunas object):
+    - filial e centro de custo categóricos; todas as colunas de filial usam as mesmas
+      categorias (idem para CC), então continuam comparáveis entre si, e '00' / '00000000'
+      são sempre categorias válidas para fillna;
+    - CPF e NOMETITULAR como strings do Arrow (string[pyarrow]). O CPF fica texto, e não
+      int64: é exibido, exportado e cruzado com as outras tabelas com os zeros à esquerda,
+      e as 11 posições mais o offset do Arrow já custam só ~15 bytes por linha;
+    - valores mantidos em float64 (em float32 os totais perdem os centavos).
+    Colunas ausentes na tabela são ignoradas.
+    """
+    tipos = {}
+    for colunas, padrao in ((COLUNAS_FILIAL, '00'), (COLUNAS_CC, '00000000')):
+        colunas = [coluna for coluna in colunas if coluna in tabela.columns]
+        if colunas:
+            codigos = set(pd.unique(tabela[colunas].to_numpy().ravel())) | {padrao}
+            categorias = pd.CategoricalDtype(sorted((c for c in codigos if pd.notna(c)), key=str))
+            tipos.update(dict.fromkeys(colunas, categorias))
+    for coluna in ['CPF', 'NOMETITULAR']:
+        if coluna in tabela.columns:
+            tipos[coluna] = pd.StringDtype('pyarrow')
+    return tabela.astype(tipos)
+
+def particionar_orcamento(caminho_orcamento, meses, ano=None):
+    """
+    Lê o orçamento uma única vez e separa os recorrentes de cada mês ({mes: DataFrame}).
+    Meses sem orçamento recebem uma tabela vazia.
+    """
+    ano = ano or datetime.now().strftime('%Y')
+    recorrentes = ler_orcamento(caminho_orcamento)
+    por_anomes = dict(tuple(recorrentes.groupby('ANOMES', sort=False)))
+    vazio = recorrentes.iloc[:0]
+    return {
+        mes: por_anomes.get(f"{ano}{mes}", vazio).drop(columns=['ANOMES'])
+        for mes in meses
+    }
+
+def _processar_mes(caminho_beneficios, recorrentes, modo_ednaldo):
+    # Executado em um processo separado para cada mês do lote
+    fonte = io.BytesIO(caminho_beneficios) if isinstance(caminho_beneficios, bytes) else caminho_beneficios
+    beneficios = preparar_beneficios(fonte, modo_ednaldo)
+    if beneficios['consolidado'] is None:
+        return beneficios['planilhas']
+    return montar_relatorio(beneficios['consolidado'], recorrentes)
+
+def gerar_relatorios_lote(arquivos_beneficios, caminho_orcamento, modo_ednaldo=False, ano=None, max_processos=None):
+    """
+    Gera o relatório realizado x orçado de vários meses de uma vez.
+
+    arquivos_beneficios é um dicionário {mes: arquivo de benefícios do mês}, com mes no
+    formato '01'..'12'. O orçamento é lido uma única vez e cada mês é processado em um
+    processo separado (max_processos=1 processa tudo no processo atual).
+
+    Retorna (relatorio, erros): relatorio é a tabela de todos os meses empilhados, com a
+    coluna ANOMES na frente (None se nenhum mês foi processado), e erros traz o log de
+    carregamento dos meses cujo arquivo não pôde ser lido ({mes: log}).
+    """
+    ano = ano or datetime.now().strftime('%Y')
+    meses = sorted(arquivos_beneficios)
+    recorrentes = particionar_orcamento(caminho_orcamento, meses, ano)
+
+    if max_processos == 1 or len(meses) == 1:
+        resultados = [
+            _processar_mes(arquivos_beneficios[mes], recorrentes[mes], modo_ednaldo)
+            for mes in meses
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=max_processos, mp_context=CONTEXTO_PROCESSOS) as executor:
+            futuros = [
+                executor.submit(_processar_mes, conteudo_arquivo(arquivos_beneficios[mes]), recorrentes[mes], modo_ednaldo)
+                for mes in meses
+            ]
+            resultados = [futuro.result() for futuro in futuros]
+
+    relatorios = {}
+    erros = {}
+    for mes, resultado in zip(meses, resultados):
+        if isinstance(resultado, pd.DataFrame):
+            relatorios[f"{ano}{mes}"] = resultado
         else:
-            unimed, va, clin, sv = processar_completo(planilhas)
-            sv2 = None
+            erros[mes] = resultado
 
-        atualizar_progresso(80, "Dados processados")
+    if not relatorios:
+        return None, erros
 
-        tabela_final = juntar_tabelas(cpfs, unimed, va, clin, sv, sv2, modo_ednaldo)
-        
-        # Adicionar os nomes dos beneficiários na tabela final
-        tabela_final['NOMETITULAR'] = tabela_final['CPF'].map(nomes_por_cpf)
-        
-        atualizar_progresso(100, "Dados consolidados")
+    relatorio = (
+        pd.concat(relatorios, names=['ANOMES'])
+        .reset_index(level='ANOMES')
+        .reset_index(drop=True)
+    )
+    return relatorio, erros
 
-        # Leitura do arquivo BI (Business Intelligence)
-        resultado_bi = pd.read_excel(
-            caminho_bi,
-            dtype={
-                'COD CENTRO CUSTO': str,
-                'SINTETICO': str,
-                'CONTA': str,
-                'VALOR': float
-            },
-            usecols=['COD CENTRO CUSTO', 'SINTETICO', 'CONTA', 'VALOR']
-        )
-
-        resultado_bi = resultado_bi.rename(columns={
-            'COD CENTRO CUSTO': 'CC',
-            'SINTETICO': 'FILIAL',
-            'CONTA': 'BENEFICIO'
-        })
+def gerar_comparacao_bi(beneficios: dict, caminho_bi: str, progresso=None, compacto=False):
+    def atualizar_progresso(porc, mensagem=""):
+        if progresso:
+            progresso(porc, mensagem)
 
-        beneficios_excluidos = ['SUBSIDIO EDUCACAO', 'CURSOS E TREINAMENTOS', 'VALE TRANSPORTE']
-        resultado_bi = resultado_bi[~resultado_bi['BENEFICIO'].isin(beneficios_excluidos)]
+    if beneficios['consolidado'] is None:
+        return beneficios['planilhas'], None
 
-        mapeamento_filiais = {
-            'CD3 - CABEDELO': '31',
-            'CD7 - CABEDELO 2': '59',
-            'CD1 - SANTA CECILIA': '02',
-            'AST': '67',
-            'CD4 - CAMPINA GRANDE': '41',
-            'CD6 - IRECE': '58'
-        }
-        resultado_bi['FILIAL'] = resultado_bi['FILIAL'].replace(mapeamento_filiais)
+    tabela_final = beneficios['consolidado']
+    if compacto:
+        tabela_final = compactar_relatorio(tabela_final)
 
-        mapeamento_beneficios = {
-            'VALE ALIMENTACAO - PAT': 'VA',
-            'ASSISTENCIA MEDICA': 'UNIMED',
-            'ASSISTENCIA ODONTOLOGICA': 'CLIN',
-            'SEGURO DE VIDA': 'SV'
-        }
-        resultado_bi['BENEFICIO'] = resultado_bi['BENEFICIO'].replace(mapeamento_beneficios)
+    atualizar_progresso(0, "Carregando BI...")
+    # Leitura do arquivo BI (Business Intelligence)
+    resultado_bi = ler_excel(
+        caminho_bi,
+        dtype={
+            'COD CENTRO CUSTO': str,
+            'SINTETICO': str,
+            'CONTA': str,
+            'VALOR': float
+        },
+        usecols=['COD CENTRO CUSTO', 'SINTETICO', 'CONTA', 'VALOR']
+    )
 
-        resultado_bi['VALOR'] = resultado_bi['VALOR'] * -1
+    resultado_bi = resultado_bi.rename(columns={
+        'COD CENTRO CUSTO': 'CC',
+        'SINTETICO': 'FILIAL',
+        'CONTA': 'BENEFICIO'
+    })
 
-        return tabela_final, resultado_bi
-    else:
-        return planilhas, None
-    
+    beneficios_excluidos = ['SUBSIDIO EDUCACAO', 'CURSOS E TREINAMENTOS', 'VALE TRANSPORTE']
+    resultado_bi = resultado_bi[~resultado_bi['BENEFICIO'].isin(beneficios_excluidos)]
+
+    mapeamento_filiais = {
+        'CD3 - CABEDELO': '31',
+        'CD7 - CABEDELO 2': '59',
+        'CD1 - SANTA CECILIA': '02',
+        'AST': '67',
+        'CD4 - CAMPINA GRANDE': '41',
+        'CD6 - IRECE': '58'
+    }
+    resultado_bi['FILIAL'] = resultado_bi['FILIAL'].replace(mapeamento_filiais)
+
+    mapeamento_beneficios = {
+        'VALE ALIMENTACAO - PAT': 'VA',
+        'ASSISTENCIA MEDICA': 'UNIMED',
+        'ASSISTENCIA ODONTOLOGICA': 'CLIN',
+        'SEGURO DE VIDA': 'SV'
+    }
+    resultado_bi['BENEFICIO'] = resultado_bi['BENEFICIO'].replace(mapeamento_beneficios)
 
+    resultado_bi['VALOR'] = resultado_bi['VALOR'] * -1
+    atualizar_progresso(100, "BI carregado")
+
+    return tabela_final, resultado_bi
+
+
+@em_cache()
 def estruturar_dados(caminho_arquivo, nomes_abas = ['REALIZADO', 'ORCADO']):
     def padronizar_colunas(df: pd.DataFrame) -> pd.DataFrame:
         def remover_acentos(texto: str) -> str:
@@ -412,8 +771,9 @@ def estruturar_dados(caminho_arquivo, nomes_abas = ['REALIZADO', 'ORCADO']):
         df.columns = colunas_padronizadas
         return df
 
-    realizado = pd.read_excel(caminho_arquivo, sheet_name= nomes_abas[0], dtype= str)
-    orcamento = pd.read_excel(caminho_arquivo, sheet_name= nomes_abas[1], dtype=str)
+    arquivo_excel = abrir_excel(caminho_arquivo)
+    realizado = ler_excel(arquivo_excel, sheet_name= nomes_abas[0], dtype= str)
+    orcamento = ler_excel(arquivo_excel, sheet_name= nomes_abas[1], dtype=str)
     realizado = padronizar_colunas(realizado)
     orcamento = padronizar_colunas(orcamento)
     realizado['VALOR'] = realizado['VALOR'].apply(float) * -1
@@ -489,3 +849,184 @@ def consolidar_orcado_realizado(df_orcado: pd.DataFrame,
     )
 
     return df_merge[cols_ordenadas]
+
+
+def _celula_cabecalho(aba, valor):
+    celula = WriteOnlyCell(aba, value=valor)
+    celula.font = Font(bold=True)
+    return celula
+
+def _celula_moeda(aba, valor):
+    celula = WriteOnlyCell(aba, value=valor)
+    celula.number_format = FORMATO_MOEDA
+    return celula
+
+def _escrever_aba(workbook, nome_aba, tabela):
+    """
+    Escreve a tabela em uma nova aba do workbook em modo write_only, em blocos de linhas.
+    Colunas de ponto flutuante (valores em reais) recebem o formato de moeda do Excel.
+    """
+    aba = workbook.create_sheet(nome_aba)
+    aba.append([_celula_cabecalho(aba, str(coluna)) for coluna in tabela.columns])
+
+    moeda = [pd.api.types.is_float_dtype(tipo) for tipo in tabela.dtypes]
+    for inicio in range(0, len(tabela), TAMANHO_BLOCO_EXCEL):
+        bloco = tabela.iloc[inicio:inicio + TAMANHO_BLOCO_EXCEL]
+        bloco = bloco.astype(object).where(bloco.notna(), None)
+        for linha in bloco.itertuples(index=False, name=None):
+            aba.append([
+                _celula_moeda(aba, valor) if eh_moeda and valor is not None else valor
+                for valor, eh_moeda in zip(linha, moeda)
+            ])
+
+def _dividir_tabela(tabela, limite_linhas):
+    return [tabela.iloc[inicio:inicio + limite_linhas] for inicio in range(0, max(len(tabela), 1), limite_linhas)]
+
+def _salvar_workbook(abas, destino):
+    workbook = Workbook(write_only=True)
+    for nome_aba, tabela in abas.items():
+        _escrever_aba(workbook, nome_aba, tabela)
+    saida = destino if destino is not None else io.BytesIO()
+    workbook.save(saida)
+    return saida.getvalue() if destino is None else destino
+
+def exportar_excel(abas, destino=None, dividir_arquivos=False, limite_linhas=LIMITE_LINHAS_EXCEL):
+    """
+    Grava as tabelas em um arquivo Excel, uma aba por item de abas ({nome_aba: DataFrame}).
+    Tabelas None são ignoradas. Se destino for None, retorna o conteúdo do arquivo em bytes.
+
+    As linhas são gravadas em modo write_only (sem montar a planilha inteira em memória) e as
+    colunas de valores saem com formato de moeda (R$) do próprio Excel.
+    Tabelas com mais de limite_linhas continuam em abas "<nome> (2)", "<nome> (3)"...; com
+    dividir_arquivos=True, cada parte vai para um arquivo separado (destino, destino_parte2...)
+    e o retorno é a lista de arquivos gravados (ou de conteúdos em bytes).
+    """
+    partes = {
+        nome_aba: _dividir_tabela(tabela, limite_linhas)
+        for nome_aba, tabela in abas.items() if tabela is not None
+    }
+
+    if not dividir_arquivos:
+        abas_excel = {}
+        for nome_aba, pedacos in partes.items():
+            for numero, pedaco in enumerate(pedacos, start=1):
+                abas_excel[nome_aba if numero == 1 else f"{nome_aba} ({numero})"] = pedaco
+        return _salvar_workbook(abas_excel, destino)
+
+    arquivos = []
+    for numero in range(max((len(pedacos) for pedacos in partes.values()), default=1)):
+        abas_arquivo = {
+            nome_aba: pedacos[numero] for nome_aba, pedacos in partes.items() if numero < len(pedacos)
+        }
+        destino_parte = destino
+        if destino is not None and numero > 0:
+            base, extensao = os.path.splitext(destino)
+            destino_parte = f"{base}_parte{numero + 1}{extensao}"
+        arquivos.append(_salvar_workbook(abas_arquivo, destino_parte))
+    return arquivos
+
+def exportar_csv(tabela, destino=None):
+    """
+    Grava a tabela em CSV separado por ';', com vírgula decimal e UTF-8 com BOM
+    (abre direto no Excel em português). Se destino for None, retorna os bytes.
+    """
+    opcoes = {'sep': ';', 'decimal': ',', 'index': False}
+    if destino is None:
+        return tabela.to_csv(**opcoes).encode('utf-8-sig')
+    tabela.to_csv(destino, encoding='utf-8-sig', **opcoes)
+    return destino
+
+def exportar_parquet(tabela, destino=None):
+    """
+    Grava a tabela em Parquet. Se destino for None, retorna os bytes.
+    """
+    saida = destino if destino is not None else io.BytesIO()
+    tabela.to_parquet(saida, index=False)
+    return saida.getvalue() if destino is None else destino
+
+EXPORTADORES = {'csv': exportar_csv, 'parquet': exportar_parquet}
+
+def nome_arquivo_tabela(nome_tabela):
+    """
+    Nome de arquivo para uma tabela ('BI Detalhado' -> 'bi_detalhado').
+    """
+    nome = unicodedata.normalize('NFKD', nome_tabela).encode('ASCII', 'ignore').decode('ASCII')
+    return re.sub(r'\W+', '_', nome).strip('_').lower()
+
+def exportar_zip(abas, formato, destino=None):
+    """
+    Grava as tabelas ({nome: DataFrame}) em um único zip, um arquivo CSV ou Parquet por tabela.
+    Tabelas None são ignoradas. Se destino for None, retorna os bytes.
+    """
+    saida = destino if destino is not None else io.BytesIO()
+    # Parquet já é comprimido; só o CSV ganha com a compressão do zip
+    compressao = zipfile.ZIP_DEFLATED if formato == 'csv' else zipfile.ZIP_STORED
+    with zipfile.ZipFile(saida, 'w', compression=compressao) as arquivo_zip:
+        for nome_tabela, tabela in abas.items():
+            if tabela is not None:
+                arquivo_zip.writestr(f"{nome_arquivo_tabela(nome_tabela)}.{formato}", EXPORTADORES[formato](tabela))
+    return saida.getvalue() if destino is None else destino
+
+def exportar_tabelas(abas, formato='xlsx'):
+    """
+    Exporta as tabelas ({nome: DataFrame}) no formato pedido ('xlsx', 'csv' ou 'parquet').
+    No Excel, cada tabela vira uma aba; em CSV e Parquet, uma única tabela gera um arquivo
+    simples e várias tabelas são reunidas em um zip.
+    Retorna (conteúdo em bytes, extensão do arquivo).
+    """
+    if formato == 'xlsx':
+        return exportar_excel(abas), 'xlsx'
+
+    tabelas = {nome: tabela for nome, tabela in abas.items() if tabela is not None}
+    if len(tabelas) == 1:
+        return EXPORTADORES[formato](next(iter(tabelas.values()))), formato
+    return exportar_zip(tabelas, formato), 'zip'
+
+def salvar_snapshot(nome_snapshot, diretorio_base=DIRETORIO_SNAPSHOTS, **tabelas):
+    """
+    Grava tabelas consolidadas (gerar_relatorio, gerar_comparacao_bi, consolidar_orcado_realizado)
+    como arquivos Parquet em <diretorio_base>/<nome_snapshot>/<tabela>.parquet.
+    Tabelas None são ignoradas. Retorna o caminho da pasta do snapshot.
+    """
+    diretorio = os.path.join(diretorio_base, nome_snapshot)
+    os.makedirs(diretorio, exist_ok=True)
+    for nome_tabela, tabela in tabelas.items():
+        if tabela is not None:
+            tabela.to_parquet(os.path.join(diretorio, f"{nome_tabela}.parquet"), index=False)
+    return diretorio
+
+def _ler_tabela_snapshot(caminho):
+    tabela = pq.read_table(caminho, memory_map=True)
+    # O metadado do pandas só registra que a coluna era StringDtype, e o to_pandas a devolve
+    # como string[python]; as strings do esquema compacto voltam para o Arrow
+    colunas_texto = [
+        coluna['name'] for coluna in (tabela.schema.pandas_metadata or {}).get('columns', [])
+        if coluna['numpy_type'] == 'string'
+    ]
+    return tabela.to_pandas().astype(dict.fromkeys(colunas_texto, pd.StringDtype('pyarrow')))
+
+def carregar_snapshot(nome_snapshot, diretorio_base=DIRETORIO_SNAPSHOTS):
+    """
+    Lê um snapshot gravado por salvar_snapshot, com leitura mapeada em memória.
+    Retorna um dicionário {nome_tabela: DataFrame}, com os mesmos tipos das tabelas
+    salvas (inclusive as do esquema compacto, compactar_relatorio).
+    """
+    diretorio = os.path.join(diretorio_base, nome_snapshot)
+    return {
+        arquivo.removesuffix('.parquet'): _ler_tabela_snapshot(os.path.join(diretorio, arquivo))
+        for arquivo in sorted(os.listdir(diretorio)) if arquivo.endswith('.parquet')
+    }
+
+def listar_snapshots(prefixo='', diretorio_base=DIRETORIO_SNAPSHOTS):
+    """
+    Lista os snapshots salvos cujo nome começa com prefixo, do mais recente para o mais antigo
+    (pela data de gravação; o nome começa pelo mês do relatório, não pela data).
+    """
+    if not os.path.isdir(diretorio_base):
+        return []
+    return sorted(
+        (nome for nome in os.listdir(diretorio_base)
+         if nome.startswith(prefixo) and os.path.isdir(os.path.join(diretorio_base, nome))),
+        key=lambda nome: os.path.getmtime(os.path.join(diretorio_base, nome)),
+        reverse=True
+    )
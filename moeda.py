@@ -0,0 +1,26 @@
+import numpy as np
+
+
+# Os valores ficam guardados nas tabelas como float em reais. Somas, subtrações e diferenças
+# são feitas em centavos inteiros (int64), para que os totais batam centavo a centavo com o BI,
+# e o resultado volta para reais só no fim.
+
+def para_centavos(valores):
+    """
+    Converte valores em reais (Series ou DataFrame de floats) para centavos inteiros (int64),
+    arredondando para o centavo mais próximo. Valores ausentes ou infinitos contam como
+    0 centavos, como nas somas do pandas, que ignoram NaN.
+    """
+    return (valores * 100).round().where(np.isfinite(valores), 0).astype('int64')
+
+def para_reais(centavos):
+    """
+    Converte centavos inteiros (Series ou DataFrame) de volta para reais em float64.
+    """
+    return centavos / 100
+
+def somar_reais(valores):
+    """
+    Soma valores em reais fazendo a conta em centavos. Retorna float em reais.
+    """
+    return int(para_centavos(valores).sum()) / 100
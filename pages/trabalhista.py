@@ -3,7 +3,6 @@ import pandas as pd
 import main
 import utilitarios as ut
 import warnings
-import io
 from datetime import datetime
 
 
@@ -59,19 +58,32 @@ with st.sidebar:
 
     if st.session_state.data_folha is not None:
 
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            st.session_state.data_folha.to_excel(writer, sheet_name='Consolidado', index=False)
-                    
+        # Exportação em Excel, CSV ou Parquet; o arquivo só é gerado quando pedido
+        # e fica guardado na sessão até um novo processamento
         with st.sidebar.container():
-            st.download_button(
-                label="📥 Baixar Relatório Excel",
-                data=output.getvalue(),
-                file_name=f"trabalhista_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
+            ut.exibir_exportacao(
+                'trabalhista',
+                f"trabalhista_{datetime.now().strftime('%Y%m%d')}",
+                {'Consolidado': st.session_state.data_folha},
+                main.exportar_tabelas
             )
 
+        # Snapshot Parquet do resultado, para reabrir sem reprocessar o arquivo
+        if st.button("💾 Salvar Snapshot", use_container_width=True):
+            main.salvar_snapshot(
+                f"trabalhista_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                consolidado=st.session_state.data_folha
+            )
+            st.success("✅ Snapshot salvo!")
+
+    snapshots_salvos = main.listar_snapshots('trabalhista_')
+    if snapshots_salvos:
+        with st.expander("📂 Abrir Snapshot Salvo"):
+            snapshot_selecionado = st.selectbox("Snapshot:", snapshots_salvos, key="snapshot_trabalhista")
+            if st.button("Abrir Snapshot", use_container_width=True):
+                st.session_state.data_folha = main.carregar_snapshot(snapshot_selecionado)['consolidado']
+                st.rerun()
+
     st.subheader("📋 Status dos Arquivos")
     st.write(f"Arquivo Realizado: {'✅' if data_folha else '❌'}")
 
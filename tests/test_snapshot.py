@@ -0,0 +1,36 @@
+import pandas as pd
+
+import main
+
+
+def relatorio_exemplo():
+    linhas = {
+        'CPF': ['01234567890', '98765432100', '11122233344'],
+        'NOMETITULAR': ['ANA', 'BRUNO', ''],
+        'previsto_filial': ['02', '31', '00'],
+    }
+    for sufixo in ['va', 'unimed', 'clin', 'sv']:
+        linhas[f'previsto_{sufixo}'] = [100.0, 0.0, 50.5]
+        linhas[f'filial_realizada_{sufixo}'] = ['02', '41', '00']
+        linhas[f'CC_realizado_{sufixo}'] = ['31010101', '41010103', '00000000']
+        linhas[f'realizado_{sufixo}'] = [99.9, 10.0, 0.0]
+    return pd.DataFrame(linhas)
+
+
+def test_snapshot_preserva_esquema_compacto(tmp_path):
+    compacto = main.compactar_relatorio(relatorio_exemplo())
+    main.salvar_snapshot('beneficios_03_teste', tmp_path, consolidado=compacto)
+
+    reaberto = main.carregar_snapshot('beneficios_03_teste', tmp_path)['consolidado']
+
+    assert reaberto.dtypes.to_dict() == compacto.dtypes.to_dict()
+    pd.testing.assert_frame_equal(reaberto, compacto)
+
+
+def test_snapshot_mantem_colunas_object(tmp_path):
+    relatorio = relatorio_exemplo()
+    main.salvar_snapshot('beneficios_03_teste', tmp_path, consolidado=relatorio)
+
+    reaberto = main.carregar_snapshot('beneficios_03_teste', tmp_path)['consolidado']
+
+    pd.testing.assert_frame_equal(reaberto, relatorio)
@@ -1,6 +1,7 @@
 import pandas as pd
 import streamlit as st
 import numpy as np
+from moeda import para_centavos, para_reais, somar_reais
 
 
 mapeamento_beneficios = {
@@ -37,94 +38,169 @@ def format_currency(value):
         return str(value)
 
 
-############################ ANNA TAB 1
+def _mesma_entrada(anterior, atual):
+    if isinstance(atual, (pd.DataFrame, pd.Series)) or isinstance(anterior, (pd.DataFrame, pd.Series)):
+        return anterior is atual
+    return anterior == atual
 
-def comparar_dados(df_resultado, bi_resultado):
+def memoizar_na_sessao(nome, funcao, *args):
     """
-    Compara dados entre os dataframes df_resultado e bi_resultado
-    Retorna um dicionário com comparações por filial e por centro de custo
+    Executa funcao(*args) e guarda o resultado no st.session_state, reaproveitando-o
+    enquanto as entradas forem as mesmas. DataFrames são comparados por identidade:
+    eles ficam no session_state entre as execuções do script, então mudar um selectbox
+    só fatia o resultado pronto, e um novo processamento (novos objetos) recalcula.
     """
-    resultados_comparacao = {}
+    encontrado, resultado = resultado_memoizado(nome, *args)
+    if encontrado:
+        return resultado
 
-    # Processar comparação por filial
-    for beneficio_bi, beneficio_df in mapeamento_beneficios.items():
-        bi_por_filial = (
-            bi_resultado[bi_resultado['BENEFICIO'] == beneficio_bi]
-            .groupby('FILIAL')['VALOR']
-            .sum()
-            .reset_index()
-        )
-        bi_por_filial.rename(
-            columns={'VALOR': f'valor_bi_{beneficio_df}'},
-            inplace=True
-        )
+    resultado = funcao(*args)
+    st.session_state[f'_memo_{nome}'] = (args, resultado)
+    return resultado
 
-        coluna_df_valor = f'realizado_{beneficio_df}'
-        coluna_df_filial = f'filial_realizada_{beneficio_df}'
-        df_por_filial = (
-            df_resultado
-            .groupby(coluna_df_filial)[coluna_df_valor]
-            .sum()
-            .reset_index()
-        )
-        df_por_filial.rename(
-            columns={coluna_df_filial: 'FILIAL', coluna_df_valor: f'valor_df_{beneficio_df}'},
-            inplace=True
-        )
+def resultado_memoizado(nome, *args):
+    """
+    Retorna (True, resultado) se memoizar_na_sessao já guardou um resultado de nome
+    para essas entradas, senão (False, None), sem calcular nada.
+    """
+    memo = st.session_state.get(f'_memo_{nome}')
+    if memo is not None:
+        entradas, resultado = memo
+        if len(entradas) == len(args) and all(map(_mesma_entrada, entradas, args)):
+            return True, resultado
+    return False, None
+
+def descartar_memoizado(nome):
+    """
+    Remove do st.session_state o resultado guardado por memoizar_na_sessao para nome,
+    liberando as entradas (DataFrames) e o resultado que ele mantinha vivos.
+    """
+    st.session_state.pop(f'_memo_{nome}', None)
 
-        comparacao_filial = pd.merge(
-            bi_por_filial,
-            df_por_filial,
-            on='FILIAL',
-            how='outer'
-        ).fillna(0)
 
-        comparacao_filial[f'diferenca_{beneficio_df}'] = (
-            comparacao_filial[f'valor_bi_{beneficio_df}']
-            - comparacao_filial[f'valor_df_{beneficio_df}']
-        )
+formatos_exportacao = {
+    'Excel (.xlsx)': 'xlsx',
+    'CSV (separado por ;)': 'csv',
+    'Parquet': 'parquet'
+}
 
-        resultados_comparacao[f'{beneficio_bi}_por_filial'] = comparacao_filial
+tipos_arquivo = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'zip': 'application/zip'
+}
 
-    # Processar comparação por centro de custo
-    for beneficio_bi, beneficio_df in mapeamento_beneficios.items():
-        bi_por_cc = (
-            bi_resultado[bi_resultado['BENEFICIO'] == beneficio_bi]
-            .groupby('CC')['VALOR']
-            .sum()
-            .reset_index()
-        )
-        bi_por_cc.rename(
-            columns={'VALOR': f'valor_bi_{beneficio_df}'},
-            inplace=True
-        )
+def exibir_exportacao(chave, prefixo_arquivo, abas, exportar_tabelas):
+    """
+    Exibe a exportação das tabelas (abas = {nome: DataFrame}) em Excel, CSV ou Parquet,
+    de todas as tabelas ou de uma só; CSV e Parquet com várias tabelas saem em um zip.
+    O arquivo só é gerado quando pedido e fica guardado na sessão enquanto as tabelas e
+    as opções forem as mesmas. exportar_tabelas é main.exportar_tabelas.
+    """
+    tabelas = {nome: tabela for nome, tabela in abas.items() if tabela is not None}
 
-        coluna_df_valor = f'realizado_{beneficio_df}'
-        coluna_df_cc = f'CC_realizado_{beneficio_df}'
-        df_por_cc = (
-            df_resultado
-            .groupby(coluna_df_cc)[coluna_df_valor]
-            .sum()
-            .reset_index()
-        )
-        df_por_cc.rename(
-            columns={coluna_df_cc: 'CC', coluna_df_valor: f'valor_df_{beneficio_df}'},
-            inplace=True
+    formato = formatos_exportacao[
+        st.selectbox("Formato do arquivo:", list(formatos_exportacao), key=f"formato_{chave}")
+    ]
+    escolha = 'Todas'
+    if len(tabelas) > 1:
+        escolha = st.selectbox("Tabelas:", ['Todas'] + list(tabelas), key=f"tabelas_{chave}")
+    selecionadas = tabelas if escolha == 'Todas' else {escolha: tabelas[escolha]}
+
+    def exportar(formato, nomes, *dados):
+        return exportar_tabelas(dict(zip(nomes, dados)), formato)
+
+    entradas = (formato, tuple(selecionadas), *selecionadas.values())
+    pronto, arquivo = resultado_memoizado(f'exportacao_{chave}', *entradas)
+    if not pronto:
+        # Arquivo de outras tabelas (novo processamento, snapshot aberto) ou de outras
+        # opções: não fica na sessão segurando as tabelas antigas e os bytes gerados
+        descartar_memoizado(f'exportacao_{chave}')
+
+    if not pronto and st.button("📄 Preparar Arquivo", use_container_width=True, key=f"preparar_{chave}"):
+        with st.spinner("Gerando o arquivo..."):
+            arquivo = memoizar_na_sessao(f'exportacao_{chave}', exportar, *entradas)
+        pronto = True
+
+    if pronto:
+        conteudo, extensao = arquivo
+        sufixo = '' if escolha == 'Todas' else '_' + escolha.lower().replace(' ', '_')
+        st.download_button(
+            label=f"📥 Baixar Relatório (.{extensao})",
+            data=conteudo,
+            file_name=f"{prefixo_arquivo}{sufixo}.{extensao}",
+            mime=tipos_arquivo[extensao],
+            use_container_width=True
         )
 
-        comparacao_cc = pd.merge(
-            bi_por_cc,
-            df_por_cc,
-            on='CC',
-            how='outer'
-        ).fillna(0)
 
-        comparacao_cc[f'(bi-realizado)_{beneficio_df}'] = (
-            comparacao_cc[f'valor_bi_{beneficio_df}']
-            - comparacao_cc[f'valor_df_{beneficio_df}']
+############################ ANNA TAB 1
+
+def empilhar_realizado(df_resultado, prefixo_chave, chave):
+    """
+    Empilha as colunas {prefixo_chave}_x e realizado_x de todos os benefícios em formato
+    longo (BENEFICIO, chave, VALOR). BENEFICIO é categórico para agrupar sem custo extra.
+    """
+    sufixos = list(mapeamento_beneficios.values())
+    return pd.DataFrame({
+        'BENEFICIO': pd.Categorical.from_codes(
+            np.repeat(np.arange(len(sufixos)), len(df_resultado)),
+            categories=list(mapeamento_beneficios)
+        ),
+        chave: np.concatenate([df_resultado[f'{prefixo_chave}_{sufixo}'].to_numpy(dtype=object) for sufixo in sufixos]),
+        'VALOR': np.concatenate([df_resultado[f'realizado_{sufixo}'].to_numpy() for sufixo in sufixos]),
+    })
+
+def comparar_dados(df_resultado, bi_resultado):
+    """
+    Compara dados entre os dataframes df_resultado e bi_resultado
+    Retorna um dicionário com comparações por filial e por centro de custo
+
+    Todos os benefícios são agrupados de uma vez: o BI por (BENEFICIO, FILIAL/CC) e o
+    df_resultado em formato longo (empilhar_realizado).
+    """
+    resultados_comparacao = {}
+    # Somas e diferenças em centavos (moeda.py)
+    bi_centavos = bi_resultado.assign(VALOR=para_centavos(bi_resultado['VALOR']))
+
+    niveis = [
+        ('filial', 'FILIAL', 'filial_realizada', 'diferenca'),
+        ('cc', 'CC', 'CC_realizado', '(bi-realizado)'),
+    ]
+
+    for nivel, chave, prefixo_df, prefixo_diferenca in niveis:
+        bi_agrupado = bi_centavos.groupby(['BENEFICIO', chave], observed=True)['VALOR'].sum()
+        realizado = empilhar_realizado(df_resultado, prefixo_df, chave)
+        df_agrupado = (
+            realizado.assign(VALOR=para_centavos(realizado['VALOR']))
+            .groupby(['BENEFICIO', chave], observed=True)['VALOR'].sum()
+        )
+        df_agrupado.index = df_agrupado.index.set_levels(
+            df_agrupado.index.levels[0].astype(object), level='BENEFICIO'
         )
 
-        resultados_comparacao[f'{beneficio_bi}_por_cc'] = comparacao_cc
+        comparacao = (
+            pd.concat({'valor_bi': bi_agrupado, 'valor_df': df_agrupado}, axis=1)
+            .fillna(0)
+            .astype('int64')
+            .sort_index()
+        )
+        comparacao['diferenca'] = comparacao['valor_bi'] - comparacao['valor_df']
+        comparacao = para_reais(comparacao)
+        por_beneficio = dict(tuple(comparacao.groupby(level='BENEFICIO')))
+
+        for beneficio_bi, beneficio_df in mapeamento_beneficios.items():
+            tabela = por_beneficio.get(beneficio_bi, comparacao.iloc[:0])
+            resultados_comparacao[f'{beneficio_bi}_por_{nivel}'] = (
+                tabela.droplevel('BENEFICIO')
+                .reset_index()
+                .rename(columns={
+                    'valor_bi': f'valor_bi_{beneficio_df}',
+                    'valor_df': f'valor_df_{beneficio_df}',
+                    'diferenca': f'{prefixo_diferenca}_{beneficio_df}'
+                })
+            )
 
     return resultados_comparacao
 
@@ -153,13 +229,34 @@ def formatar_moeda_dataframe(df, colunas_moeda=None):
 
     return df_formatado
 
+def mapear_ccs_por_filial(df_resultado, bi_resultado):
+    """
+    Retorna {(beneficio, filial): set de CCs} com os centros de custo presentes
+    no BI ou no df_resultado para cada benefício e filial
+    """
+    partes = [bi_resultado[['BENEFICIO', 'FILIAL', 'CC']]]
+    for beneficio_bi, beneficio_df in mapeamento_beneficios.items():
+        coluna_filial = f'filial_realizada_{beneficio_df}'
+        coluna_cc = f'CC_realizado_{beneficio_df}'
+        if coluna_filial in df_resultado.columns and coluna_cc in df_resultado.columns:
+            partes.append(
+                df_resultado[[coluna_filial, coluna_cc]]
+                .set_axis(['FILIAL', 'CC'], axis=1)
+                .assign(BENEFICIO=beneficio_bi)
+            )
+
+    pares = pd.concat(partes, ignore_index=True).dropna(subset=['FILIAL', 'CC']).drop_duplicates()
+    return pares.groupby(['BENEFICIO', 'FILIAL'])['CC'].agg(set).to_dict()
+
 def exibir_painel_comparacao(df_resultado, bi_resultado):
     """
     Exibe painel de comparação entre dados de rateio e BI no Streamlit
     """
     st.header("Comparação entre Rateio e BI")
 
-    resultados = comparar_dados(df_resultado, bi_resultado)
+    # Calculados uma vez por processamento; os filtros abaixo só selecionam o resultado
+    resultados = memoizar_na_sessao('comparar_dados', comparar_dados, df_resultado, bi_resultado)
+    ccs_por_filial = memoizar_na_sessao('ccs_por_filial', mapear_ccs_por_filial, df_resultado, bi_resultado)
 
     # Seleção do benefício
     beneficio_selecionado = st.selectbox(
@@ -181,29 +278,8 @@ def exibir_painel_comparacao(df_resultado, bi_resultado):
 
         comparacao_cc = resultados[f"{beneficio_selecionado}_por_cc"]
 
-        # Filtrar centros de custo existentes no BI
-        ccs_bi = (
-            bi_resultado
-            [(bi_resultado['BENEFICIO'] == beneficio_selecionado)
-             & (bi_resultado['FILIAL'] == filial_escolhida)]
-            ['CC'].dropna().unique().tolist()
-        )
-
-        # Filtrar centros de custo no dataframe de resultado
-        beneficio_df = mapeamento_beneficios[beneficio_selecionado]
-        coluna_filial = f'filial_realizada_{beneficio_df}'
-        coluna_cc = f'CC_realizado_{beneficio_df}'
-
-        ccs_df = []
-        if coluna_filial in df_resultado.columns and coluna_cc in df_resultado.columns:
-            ccs_df = (
-                df_resultado
-                [(df_resultado[coluna_filial] == filial_escolhida)
-                 & df_resultado[coluna_cc].notna()]
-                [coluna_cc].unique().tolist()
-            )
-
-        todos_ccs = list(set(ccs_bi + ccs_df))
+        # Centros de custo existentes no BI ou no dataframe de resultado para a filial
+        todos_ccs = list(ccs_por_filial.get((beneficio_selecionado, filial_escolhida), set()))
         filtragem_cc = comparacao_cc[comparacao_cc['CC'].isin(todos_ccs)]
 
         if not filtragem_cc.empty:
@@ -217,95 +293,112 @@ def exibir_painel_comparacao(df_resultado, bi_resultado):
 
 ############################# ANNA TAB 2
 
-def processar_comparativo_filial(df_resultado, df_bi=None, beneficio_selecionado=None):
-    # copia o DataFrame de entrada
-    df = df_resultado.copy()
-    df.loc[:, 'previsto_filial'] = df['previsto_filial'].fillna('00')
-
-    # mapeamento dos benefícios
-    mapeamento_beneficio = {
-        "Vale Alimentação": ('va', 'previsto_va', 'realizado_va', 'filial_realizada_va', 'VA'),
-        "Assistência Médica": ('unimed', 'previsto_unimed', 'realizado_unimed', 'filial_realizada_unimed', 'UNIMED'),
-        "Assistência Odontológica": ('clin', 'previsto_clin', 'realizado_clin', 'filial_realizada_clin', 'CLIN'),
-        "Seguro de Vida": ('sv', 'previsto_sv', 'realizado_sv', 'filial_realizada_sv', 'SV')
-    }
+# Benefício exibido na aba REALIZADO VS PREVISTO -> (sufixo das colunas, nome no BI)
+beneficios_comparativo = {
+    "Vale Alimentação": ('va', 'VA'),
+    "Assistência Médica": ('unimed', 'UNIMED'),
+    "Assistência Odontológica": ('clin', 'CLIN'),
+    "Seguro de Vida": ('sv', 'SV')
+}
+
+def selecionar_beneficio(agrupado, beneficio):
+    """
+    Seleciona um benefício de um resultado agrupado por (BENEFICIO, ...), retirando esse nível
+    """
+    mascara = agrupado.index.get_level_values('BENEFICIO') == beneficio
+    return agrupado[mascara].droplevel('BENEFICIO')
+
+def calcular_comparativos_filial(df_resultado, df_bi=None):
+    """
+    Calcula o comparativo orçado x realizado por filial de todos os benefícios de uma vez.
+    Retorna {benefício: DataFrame numérico}, com as colunas de processar_comparativo_filial.
+    O realizado vem do BI quando df_bi é informado; as quantidades vêm sempre do df_resultado.
+    """
+    # Somas e diferenças em centavos (moeda.py)
+    previsto_filial = df_resultado['previsto_filial'].astype(object).fillna('00')
+    colunas_previsto = [f'previsto_{sufixo}' for sufixo, _ in beneficios_comparativo.values()]
 
-    # obtém as colunas a partir do benefício selecionado
-    tipo_beneficio, coluna_prevista, coluna_realizado, coluna_filial_realizada, nome_bi_beneficio = \
-        mapeamento_beneficio[beneficio_selecionado]
+    # orçado: um groupby por previsto_filial para todos os benefícios
+    previstos = df_resultado[colunas_previsto]
+    soma_previsto = para_centavos(previstos).groupby(previsto_filial).sum()
+    qtd_previsto = (previstos > 0).groupby(previsto_filial).sum()
 
-    lista_comparativo_filiais = []
+    # realizado: colunas realizado_* empilhadas, agrupadas por (benefício, filial realizada)
+    realizado = empilhar_realizado(df_resultado, 'filial_realizada', 'Filial')
+    realizado['positivo'] = realizado['VALOR'] > 0
+    realizado['VALOR'] = para_centavos(realizado['VALOR'])
+    realizado = realizado.groupby(['BENEFICIO', 'Filial'], observed=True)[['VALOR', 'positivo']].sum()
 
-    # coleta todas as filiais a partir dos dados de previsto e realizados
-    todas_filiais = set(df['previsto_filial'].unique())
-    todas_filiais.update(df[coluna_filial_realizada].unique())
     if df_bi is not None:
-        filiais_bi = df_bi[df_bi['BENEFICIO'] == nome_bi_beneficio]['FILIAL'].unique()
-        todas_filiais.update(filiais_bi)
-    todas_filiais = sorted(todas_filiais)
-
-    for filial in todas_filiais:
-        # soma orçado
-        df_previsto_filial = df[df['previsto_filial'] == filial]
-        soma_previsto = df_previsto_filial[coluna_prevista].sum()
-        qtd_previsto = df_previsto_filial[df_previsto_filial[coluna_prevista] > 0].shape[0]
+        realizado_bi = (
+            df_bi.assign(VALOR=para_centavos(df_bi['VALOR']))
+            .groupby(['BENEFICIO', 'FILIAL'], observed=True)['VALOR'].sum()
+        )
 
-        # soma realizado (prefere dados do BI, se existir)
+    comparativos = {}
+    for beneficio, (sufixo, nome_bi) in beneficios_comparativo.items():
+        realizado_beneficio = selecionar_beneficio(realizado, nome_bi)
+        filiais = soma_previsto.index.union(realizado_beneficio.index)
         if df_bi is not None:
-            soma_realizado = df_bi[
-                (df_bi['FILIAL'] == filial) & (df_bi['BENEFICIO'] == nome_bi_beneficio)
-            ]['VALOR'].sum()
+            bi_beneficio = selecionar_beneficio(realizado_bi, nome_bi)
+            filiais = filiais.union(bi_beneficio.index)
+            soma_realizado = bi_beneficio.reindex(filiais, fill_value=0)
         else:
-            df_realizado_filial = df[df[coluna_filial_realizada] == filial]
-            soma_realizado = df_realizado_filial[coluna_realizado].sum()
-
-        # quantidade realizado
-        df_realizado_filial = df[df[coluna_filial_realizada] == filial]
-        qtd_realizado = df_realizado_filial[df_realizado_filial[coluna_realizado] > 0].shape[0]
+            soma_realizado = realizado_beneficio['VALOR'].reindex(filiais, fill_value=0)
 
-        # diferença e variação percentual
-        diferenca = soma_realizado - soma_previsto
-        variacao_pct = (soma_realizado / soma_previsto * 100) if soma_previsto != 0 else 0
+        orcado = soma_previsto[f'previsto_{sufixo}'].reindex(filiais, fill_value=0)
+        diferenca = para_reais(soma_realizado - orcado)
+        orcado, soma_realizado = para_reais(orcado), para_reais(soma_realizado)
 
-        lista_comparativo_filiais.append({
-            'Filial': filial,
-            'Orçado': soma_previsto,
-            'Qtd. Orçado': qtd_previsto,
+        comparativo = pd.DataFrame({
+            'Orçado': orcado,
+            'Qtd. Orçado': qtd_previsto[f'previsto_{sufixo}'].reindex(filiais, fill_value=0),
             'Realizado': soma_realizado,
-            'Qtd. Realizado': qtd_realizado,
-            'Variação (%)': variacao_pct,
+            'Qtd. Realizado': realizado_beneficio['positivo'].reindex(filiais, fill_value=0),
+            'Variação (%)': (soma_realizado / orcado.where(orcado != 0) * 100).fillna(0),
             'Diferença': diferenca,
             'Justificativa': None
         })
+        comparativos[beneficio] = comparativo.rename_axis('Filial').sort_index().reset_index()
 
-    # monta DataFrame final e ordena por filial
-    df_comparativo = pd.DataFrame(lista_comparativo_filiais).sort_values(by='Filial')
+    return comparativos
 
-    # formata as colunas de valor como moeda brasileira
-    colunas_monetarias = ['Orçado', 'Realizado', 'Diferença']
-    for col in colunas_monetarias:
+def formatar_comparativo_filial(df_comparativo):
+    """
+    Formata as colunas de valor do comparativo por filial como moeda brasileira
+    """
+    df_comparativo = df_comparativo.copy()
+    for col in ['Orçado', 'Realizado', 'Diferença']:
         df_comparativo[col] = df_comparativo[col].apply(
             lambda x: f"R$ {x:,.2f}"
                 .replace(",", "X")  # temporário: vira milhar
                 .replace(".", ",")  # ponto decimal → vírgula
                 .replace("X", ".")  # milhar volta a ponto
         )
-
-    # exibe no Streamlit
     return df_comparativo
 
+def processar_comparativo_filial(df_resultado, df_bi=None, beneficio_selecionado=None):
+    comparativos = calcular_comparativos_filial(df_resultado, df_bi)
+    return formatar_comparativo_filial(comparativos[beneficio_selecionado])
+
 def exibir_comparativo_filial(df_resultado, df_bi, beneficio_selecionado):
-    
-    st.dataframe(processar_comparativo_filial(df_resultado, df_bi, beneficio_selecionado))
+    # Os quatro benefícios são calculados uma vez; trocar o benefício só seleciona a tabela
+    comparativos = memoizar_na_sessao('comparativos_filial', calcular_comparativos_filial, df_resultado, df_bi)
+    st.dataframe(formatar_comparativo_filial(comparativos[beneficio_selecionado]))
 
 ############################# ANNA TAB 3
 
-def categorizar_colaboradores_por_filial(dados_resultado, filial_selecionada):
+def indexar_movimentacoes(dados_resultado):
+    """
+    Classifica uma única vez os colaboradores de cada benefício em desligados, contratados
+    e transferidos (entrada e saída), já separados pela filial em que aparecem no resumo.
+    Retorna {benefício: {'desligados'|'contratados'|'transferidos': {filial: DataFrame}, 'vazio': DataFrame}}
+    """
     df = dados_resultado.copy()
     for coluna in ['previsto_filial', 'filial_realizada_va', 'filial_realizada_unimed', 
                    'filial_realizada_clin', 'filial_realizada_sv']:
         if coluna in df.columns:
-            df.loc[:, coluna] = df[coluna].astype(str).fillna('00')
+            df[coluna] = df[coluna].astype(str)
 
     beneficios = [
         ('Vale Alimentação', 'previsto_va', 'realizado_va', 'filial_realizada_va'),
@@ -314,58 +407,78 @@ def categorizar_colaboradores_por_filial(dados_resultado, filial_selecionada):
         ('Seguro de Vida', 'previsto_sv', 'realizado_sv', 'filial_realizada_sv')
     ]
 
-    desligados = {}
-    contratados = {}
-    transferidos = {}
+    def separar_por_filial(tabela, coluna_filial):
+        return dict(tuple(tabela.groupby(coluna_filial, sort=False)))
+
+    filial_orcada = df['previsto_filial']
+    indice = {}
 
     for nome_beneficio, col_previsto, col_realizado, col_filial_real in beneficios:
         if col_filial_real not in df.columns:
             continue
 
-        df_desligados = df[
-            (df['previsto_filial'] == filial_selecionada) &
-            (df[col_filial_real] == '00') &
-            (df[col_previsto] > 0)
-        ]
+        filial_real = df[col_filial_real]
+        orcado = df[col_previsto] > 0
+        realizado = df[col_realizado] > 0
+        mudou_filial = filial_orcada != filial_real
+
+        # orçados em uma filial e não realizados: indexados pela filial orçada
+        desligados = separar_por_filial(df[(filial_real == '00') & orcado], 'previsto_filial')
+
+        # não orçados e realizados: indexados pela filial realizada
+        contratados = separar_por_filial(df[(filial_orcada == '00') & realizado], col_filial_real)
+
+        # orçados em outra filial e realizados nesta: indexados pela filial realizada
+        entrada = df[mudou_filial & (filial_orcada != '00') & realizado].copy()
+        entrada[col_previsto] = 0
+        entrada['filial_orcada'] = entrada['previsto_filial']
+        entrada['filial_transferida'] = entrada[col_filial_real]
+        entrada = separar_por_filial(entrada, col_filial_real)
+
+        # orçados nesta filial e realizados em outra: indexados pela filial orçada
+        saida = df[mudou_filial & (filial_real != '00') & orcado].copy()
+        saida[col_realizado] = 0
+        saida['filial_orcada'] = saida['previsto_filial']
+        saida['filial_transferida'] = saida[col_filial_real]
+        saida = separar_por_filial(saida, 'previsto_filial')
+
+        vazio = df.iloc[:0]
+        transferidos = {
+            filial: pd.concat([entrada.get(filial, vazio), saida.get(filial, vazio)], ignore_index=True)
+            for filial in entrada.keys() | saida.keys()
+        }
 
-        df_contratados = df[
-            (df['previsto_filial'] == '00') &
-            (df[col_filial_real] == filial_selecionada) &
-            (df[col_realizado] > 0)
-        ]
+        indice[nome_beneficio] = {
+            'desligados': desligados,
+            'contratados': contratados,
+            'transferidos': transferidos,
+            'vazio': vazio
+        }
 
-        df_transferidos_entrada = df[
-            (df['previsto_filial'] != filial_selecionada) &
-            (df[col_filial_real] == filial_selecionada) &
-            (df['previsto_filial'] != '00') &
-            (df[col_realizado] > 0)
-        ]
-        if not df_transferidos_entrada.empty:
-            df_transferidos_entrada = df_transferidos_entrada.copy()
-            df_transferidos_entrada[col_previsto] = 0
-            df_transferidos_entrada['filial_orcada'] = df_transferidos_entrada['previsto_filial']
-            df_transferidos_entrada['filial_transferida'] = filial_selecionada
-
-        df_transferidos_saida = df[
-            (df['previsto_filial'] == filial_selecionada) &
-            (df[col_filial_real] != filial_selecionada) &
-            (df[col_filial_real] != '00') &
-            (df[col_previsto] > 0)
-        ]
-        if not df_transferidos_saida.empty:
-            df_transferidos_saida = df_transferidos_saida.copy()
-            df_transferidos_saida[col_realizado] = 0
-            df_transferidos_saida['filial_orcada'] = filial_selecionada
-            df_transferidos_saida['filial_transferida'] = df_transferidos_saida[col_filial_real]
+    return indice
 
-        df_transferidos = pd.concat([df_transferidos_entrada, df_transferidos_saida], ignore_index=True)
+def selecionar_movimentacoes(indice, filial_selecionada):
+    """
+    Consulta o índice de indexar_movimentacoes e retorna (desligados, contratados, transferidos)
+    da filial, cada um como {benefício: DataFrame}
+    """
+    desligados = {}
+    contratados = {}
+    transferidos = {}
 
-        desligados[nome_beneficio] = df_desligados
-        contratados[nome_beneficio] = df_contratados
-        transferidos[nome_beneficio] = df_transferidos
+    for nome_beneficio, categorias in indice.items():
+        vazio = categorias['vazio']
+        desligados[nome_beneficio] = categorias['desligados'].get(filial_selecionada, vazio)
+        contratados[nome_beneficio] = categorias['contratados'].get(filial_selecionada, vazio)
+        transferidos[nome_beneficio] = categorias['transferidos'].get(
+            filial_selecionada, vazio.reset_index(drop=True)
+        )
 
     return desligados, contratados, transferidos
 
+def categorizar_colaboradores_por_filial(dados_resultado, filial_selecionada):
+    return selecionar_movimentacoes(indexar_movimentacoes(dados_resultado), filial_selecionada)
+
 def exibir_tabela_colaboradores(df, col_previsto, col_realizado, col_filial_destino=None):
     if df.empty:
         st.info("Não há dados para exibir.")
@@ -400,8 +513,8 @@ def exibir_tabela_colaboradores(df, col_previsto, col_realizado, col_filial_dest
 
     st.dataframe(df_exibicao, use_container_width=True, hide_index=True)
 
-    total_orcado = df[col_previsto].sum()
-    total_realizado = df[col_realizado].sum()
+    total_orcado = somar_reais(df[col_previsto])
+    total_realizado = somar_reais(df[col_realizado])
 
     col1, col2 = st.columns(2)
     with col1:
@@ -441,7 +554,9 @@ def exibir_resumo_colaboradores(dados_resultado):
         st.info("Selecione uma filial para visualizar os dados.")
         return
 
-    desligados, contratados, transferidos = categorizar_colaboradores_por_filial(dados_resultado, filial_selecionada)
+    # O índice é montado uma vez por relatório; trocar a filial é só uma consulta
+    indice = memoizar_na_sessao('movimentacoes', indexar_movimentacoes, dados_resultado)
+    desligados, contratados, transferidos = selecionar_movimentacoes(indice, filial_selecionada)
 
     mapa_beneficios = {
         'Vale Alimentação': ('previsto_va', 'realizado_va', 'filial_realizada_va'),
@@ -473,9 +588,137 @@ def exibir_resumo_colaboradores(dados_resultado):
 
 
 
+############################# MATRIZ DE TRANSFERÊNCIAS
+
+def matriz_transferencias(dados_resultado):
+    """
+    Monta de uma vez as transferências entre filiais de todos os benefícios: colaboradores
+    orçados em uma filial (previsto_filial) e realizados em outra (filial_realizada_*),
+    ambas diferentes de '00'.
+    Retorna um DataFrame com Benefício, Filial Orçada, Filial Realizada, Colaboradores,
+    Orçado e Realizado; tabela_matriz_transferencias monta a visão origem x destino.
+    """
+    filial_orcada = dados_resultado['previsto_filial'].astype(str)
+    partes = []
+    for nome_beneficio, (sufixo, _) in beneficios_comparativo.items():
+        partes.append(pd.DataFrame({
+            'Benefício': nome_beneficio,
+            'CPF': dados_resultado['CPF'],
+            'Filial Orçada': filial_orcada,
+            'Filial Realizada': dados_resultado[f'filial_realizada_{sufixo}'].astype(str),
+            'Orçado': dados_resultado[f'previsto_{sufixo}'],
+            'Realizado': dados_resultado[f'realizado_{sufixo}']
+        }))
+    movimentos = pd.concat(partes, ignore_index=True)
+
+    transferidos = movimentos[
+        (movimentos['Filial Orçada'] != movimentos['Filial Realizada']) &
+        (movimentos['Filial Orçada'] != '00') &
+        (movimentos['Filial Realizada'] != '00') &
+        ((movimentos['Orçado'] > 0) | (movimentos['Realizado'] > 0))
+    ]
+
+    # Orçado e Realizado somados em centavos (moeda.py)
+    matriz = (
+        transferidos
+        .assign(Orçado=para_centavos(transferidos['Orçado']), Realizado=para_centavos(transferidos['Realizado']))
+        .groupby(['Benefício', 'Filial Orçada', 'Filial Realizada'])
+        .agg(
+            Colaboradores=('CPF', 'nunique'),
+            Orçado=('Orçado', 'sum'),
+            Realizado=('Realizado', 'sum')
+        )
+        .reset_index()
+    )
+    matriz[['Orçado', 'Realizado']] = para_reais(matriz[['Orçado', 'Realizado']])
+    return matriz
+
+def tabela_matriz_transferencias(matriz, beneficio, valor='Colaboradores'):
+    """
+    Converte o resultado de matriz_transferencias em uma tabela filial orçada (linhas)
+    x filial realizada (colunas) do benefício, com o valor escolhido
+    """
+    return (
+        matriz[matriz['Benefício'] == beneficio]
+        .pivot(index='Filial Orçada', columns='Filial Realizada', values=valor)
+        .fillna(0)
+    )
+
+def exibir_matriz_transferencias(dados_resultado):
+    st.write("Colaboradores orçados em uma filial (linhas) e realizados em outra (colunas):")
+
+    matriz = memoizar_na_sessao('matriz_transferencias', matriz_transferencias, dados_resultado)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        beneficio = st.selectbox(
+            "Benefício:",
+            options=list(beneficios_comparativo.keys()),
+            key="seletor_matriz_beneficio"
+        )
+    with col2:
+        valor = st.radio(
+            "Exibir:",
+            options=['Colaboradores', 'Orçado', 'Realizado'],
+            horizontal=True,
+            key="seletor_matriz_valor"
+        )
+
+    tabela = tabela_matriz_transferencias(matriz, beneficio, valor)
+    if tabela.empty:
+        st.info(f"Não há transferências entre filiais no benefício {beneficio}.")
+        return
+
+    if valor == 'Colaboradores':
+        st.dataframe(tabela.astype(int), use_container_width=True)
+    else:
+        st.dataframe(tabela.map(format_currency), use_container_width=True)
+
+
 ############################# lucas aqui 
 
 
+def resumir_folha_por_natureza(data_folha):
+    """
+    Calcula orçado e realizado por natureza (CONTA) e filial para todas as naturezas de uma vez.
+    Os valores e as matrículas só contam nas linhas com valor diferente de zero.
+    
+    Args:
+        data_folha (pd.DataFrame): DataFrame com os dados da folha
+    
+    Returns:
+        pd.DataFrame: indexado por (CONTA, FILIAL), com VALOR_ORCADO, QT_ORCADO,
+        VALOR_REALIZADO, QT_REALIZADO e % VARIACAO
+    """
+    def agregar(lado):
+        valor = data_folha[f'VALOR_{lado}']
+        com_valor = valor.notna() & (valor != 0)
+        return pd.DataFrame({
+            'CONTA': data_folha['CONTA'],
+            'FILIAL': data_folha[f'FILIAL_{lado}'],
+            'VALOR': valor.where(com_valor),
+            'MATRICULA': data_folha['MATRICULA'].where(com_valor)
+        }).groupby(['CONTA', 'FILIAL']).agg(
+            VALOR=('VALOR', 'sum'),
+            QT=('MATRICULA', 'nunique')
+        )
+
+    resultado = (
+        agregar('orcado').add_suffix('_ORCADO')
+        .join(agregar('realizado').add_suffix('_REALIZADO'), how='outer')
+        .fillna(0)
+        .sort_index()
+    )
+
+    # Calcular % de variação
+    resultado['% VARIACAO'] = np.where(
+        resultado['VALOR_ORCADO'] != 0,
+        ((resultado['VALOR_REALIZADO'] - resultado['VALOR_ORCADO']) / resultado['VALOR_ORCADO'] * 100).round(2),
+        np.where(resultado['VALOR_REALIZADO'] != 0, 100.0, 0.0)
+    )
+
+    return resultado[['VALOR_ORCADO', 'QT_ORCADO', 'VALOR_REALIZADO', 'QT_REALIZADO', '% VARIACAO']]
+
 def analise_folha_por_natureza(data_folha):
     """
     Função para análise da folha de pagamento por natureza
@@ -500,43 +743,11 @@ def analise_folha_por_natureza(data_folha):
     )
     
     if natureza_selecionada:
-        # Filtrar o dataframe pela natureza selecionada usando a coluna CONTA unificada
-        df_filtrado = data_folha[
-            (data_folha['CONTA'] == natureza_selecionada)
-        ].copy()
+        # Todas as naturezas são resumidas uma vez; a seleção só fatia o resultado
+        resumo = memoizar_na_sessao('folha_por_natureza', resumir_folha_por_natureza, data_folha)
         
-        if not df_filtrado.empty:
-            # Preparar dados orçados
-            orcado = df_filtrado.groupby('FILIAL_orcado').agg({
-                'VALOR_orcado': lambda x: x[x.notna() & (x != 0)].sum(),
-                'MATRICULA': lambda x: x[df_filtrado.loc[x.index, 'VALOR_orcado'].notna() & 
-                                      (df_filtrado.loc[x.index, 'VALOR_orcado'] != 0)].nunique()
-            }).reset_index()
-            orcado.columns = ['FILIAL', 'VALOR_ORCADO', 'QT_ORCADO']
-            
-            # Preparar dados realizados
-            realizado = df_filtrado.groupby('FILIAL_realizado').agg({
-                'VALOR_realizado': lambda x: x[x.notna() & (x != 0)].sum(),
-                'MATRICULA': lambda x: x[df_filtrado.loc[x.index, 'VALOR_realizado'].notna() & 
-                                       (df_filtrado.loc[x.index, 'VALOR_realizado'] != 0)].nunique()
-            }).reset_index()
-            realizado.columns = ['FILIAL', 'VALOR_REALIZADO', 'QT_REALIZADO']
-            
-            # Merge dos dados
-            resultado = pd.merge(orcado, realizado, on='FILIAL', how='outer')
-            
-            # Preencher valores NaN com 0
-            resultado = resultado.fillna(0)
-            
-            # Calcular % de variação
-            resultado['% VARIACAO'] = np.where(
-                resultado['VALOR_ORCADO'] != 0,
-                ((resultado['VALOR_REALIZADO'] - resultado['VALOR_ORCADO']) / resultado['VALOR_ORCADO'] * 100).round(2),
-                np.where(resultado['VALOR_REALIZADO'] != 0, 100.0, 0.0)
-            )
-            
-            # Reordenar colunas conforme solicitado
-            resultado = resultado[['FILIAL', 'VALOR_ORCADO', 'QT_ORCADO', 'VALOR_REALIZADO', 'QT_REALIZADO', '% VARIACAO']]
+        if natureza_selecionada in resumo.index.get_level_values('CONTA'):
+            resultado = resumo.xs(natureza_selecionada, level='CONTA').reset_index()
             
             # Calcular totais
             tot_orcado = format_currency(resultado['VALOR_ORCADO'].sum())
@@ -575,6 +786,69 @@ def format_currency(value):
         return "R$ 0,00"
     return f"R$ {value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
 
+# Agregação por matrícula usada nas visões de colaboradores da folha
+agregacao_por_matricula = {
+    'FILIAL_orcado': 'first',
+    'CENTROCUSTO_orcado': 'first',
+    'VALOR_orcado': 'sum',
+    'NOME_orcado': 'first',
+    'FILIAL_realizado': 'first',
+    'CENTROCUSTO_realizado': 'first',
+    'VALOR_realizado': 'sum',
+    'NOME_realizado': 'first'
+}
+
+def indexar_movimentacoes_folha(data_folha):
+    """
+    Monta de uma vez o cubo de movimentações da folha, com os colaboradores já agrupados
+    por matrícula para cada (filial, natureza, categoria). As categorias são:
+    1. 'desligados': orçados na filial e não realizados
+    2. 'contratados': realizados na filial e não orçados
+    3. 'transferidos': entradas (orçados em outra filial, realizados nesta) seguidas das
+       saídas (orçados nesta filial, realizados em outra)
+    """
+    df = data_folha.copy()
+
+    # Garantir que colunas de filial sejam strings
+    for coluna in ['FILIAL_orcado', 'FILIAL_realizado']:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype(str)
+
+    filial_orcado = df['FILIAL_orcado']
+    filial_realizado = df['FILIAL_realizado']
+    orcado = df['VALOR_orcado'] > 0
+    realizado = df['VALOR_realizado'] > 0
+    mudou_filial = filial_orcado != filial_realizado
+
+    # (categoria, linhas, filial em que a linha aparece)
+    partes = [
+        ('desligados', (filial_realizado == '00') & orcado, 'FILIAL_orcado'),
+        ('contratados', (filial_orcado == '00') & realizado, 'FILIAL_realizado'),
+        ('transferidos', mudou_filial & (filial_orcado != '00') & realizado, 'FILIAL_realizado'),
+        ('transferidos', mudou_filial & (filial_realizado != '00') & orcado, 'FILIAL_orcado'),
+    ]
+    movimentos = pd.concat(
+        [df[mascara].assign(CATEGORIA=categoria, FILIAL=df.loc[mascara, coluna_filial])
+         for categoria, mascara, coluna_filial in partes],
+        ignore_index=True
+    )
+
+    agrupado = movimentos.groupby(['FILIAL', 'CONTA', 'CATEGORIA', 'MATRICULA']).agg(agregacao_por_matricula)
+
+    return {
+        chave: grupo.droplevel(['FILIAL', 'CONTA', 'CATEGORIA']).reset_index()
+        for chave, grupo in agrupado.groupby(level=['FILIAL', 'CONTA', 'CATEGORIA'])
+    }
+
+def selecionar_movimentacoes_folha(cubo, filial_selecionada, natureza_selecionada):
+    """
+    Consulta o cubo de indexar_movimentacoes_folha e retorna (desligados, contratados, transferidos)
+    """
+    return tuple(
+        cubo.get((filial_selecionada, natureza_selecionada, categoria), pd.DataFrame())
+        for categoria in ['desligados', 'contratados', 'transferidos']
+    )
+
 def categorizar_colaboradores_folha_por_filial(data_folha, filial_selecionada, natureza_selecionada):
     """
     Categoriza colaboradores da folha de pagamento por filial em:
@@ -582,71 +856,8 @@ def categorizar_colaboradores_folha_por_filial(data_folha, filial_selecionada, n
     2. Realizados na filial e não orçados (contratados) 
     3. Transferências envolvendo a filial (entrada e saída)
     """
-    df = data_folha[data_folha['CONTA'] == natureza_selecionada].copy()
-    
-    if df.empty:
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-    
-    # Garantir que colunas de filial sejam strings
-    for coluna in ['FILIAL_orcado', 'FILIAL_realizado']:
-        if coluna in df.columns:
-            df.loc[:, coluna] = df[coluna].astype(str).fillna('00')
-    
-    # 1. ORÇADO E NÃO REALIZADO: Orçados na filial selecionada mas não realizados
-    df_desligados = df[
-        (df['FILIAL_orcado'] == filial_selecionada) &
-        (df['FILIAL_realizado'] == '00') &
-        (df['VALOR_orcado'] > 0)
-    ].copy()
-    
-    # 2. REALIZADO E NÃO ORÇADO: Realizados na filial selecionada mas não orçados
-    df_contratados = df[
-        (df['FILIAL_orcado'] == '00') &
-        (df['FILIAL_realizado'] == filial_selecionada) &
-        (df['VALOR_realizado'] > 0)
-    ].copy()
-    
-    # 3. TRANSFERÊNCIAS: Entrada e saída da filial selecionada
-    # Transferência de ENTRADA: Orçado em outra filial, realizado na filial selecionada
-    df_transferidos_entrada = df[
-        (df['FILIAL_orcado'] != filial_selecionada) &
-        (df['FILIAL_realizado'] == filial_selecionada) &
-        (df['FILIAL_orcado'] != '00') &
-        (df['VALOR_realizado'] > 0)
-    ].copy()
-    
-    # Transferência de SAÍDA: Orçado na filial selecionada, realizado em outra filial
-    df_transferidos_saida = df[
-        (df['FILIAL_orcado'] == filial_selecionada) &
-        (df['FILIAL_realizado'] != filial_selecionada) &
-        (df['FILIAL_realizado'] != '00') &
-        (df['VALOR_orcado'] > 0)
-    ].copy()
-    
-    # Combinar transferências de entrada e saída
-    df_transferidos = pd.concat([df_transferidos_entrada, df_transferidos_saida], ignore_index=True)
-    
-    # Agrupar por matrícula para evitar duplicatas
-    def agrupar_por_matricula(df_input):
-        if df_input.empty:
-            return pd.DataFrame()
-        
-        return df_input.groupby('MATRICULA').agg({
-            'FILIAL_orcado': 'first',
-            'CENTROCUSTO_orcado': 'first',
-            'VALOR_orcado': 'sum',
-            'NOME_orcado': 'first',
-            'FILIAL_realizado': 'first',
-            'CENTROCUSTO_realizado': 'first',
-            'VALOR_realizado': 'sum',
-            'NOME_realizado': 'first'
-        }).reset_index()
-    
-    desligados_agrupados = agrupar_por_matricula(df_desligados)
-    contratados_agrupados = agrupar_por_matricula(df_contratados)
-    transferidos_agrupados = agrupar_por_matricula(df_transferidos)
-    
-    return desligados_agrupados, contratados_agrupados, transferidos_agrupados
+    cubo = indexar_movimentacoes_folha(data_folha[data_folha['CONTA'] == natureza_selecionada])
+    return selecionar_movimentacoes_folha(cubo, filial_selecionada, natureza_selecionada)
 
 def exibir_tabela_folha(df, tipo_analise):
     """Exibe tabela formatada dos colaboradores"""
@@ -778,8 +989,9 @@ def exibir_analise_folha_pagamento(data_folha):
         st.info("Selecione uma natureza para visualizar a análise.")
         return
     
-    # Realizar categorização
-    desligados, contratados, transferidos = categorizar_colaboradores_folha_por_filial(data_folha, filial_selecionada, natureza_selecionada)
+    # Realizar categorização: o cubo é montado uma vez por relatório e os seletores só consultam
+    cubo = memoizar_na_sessao('movimentacoes_folha', indexar_movimentacoes_folha, data_folha)
+    desligados, contratados, transferidos = selecionar_movimentacoes_folha(cubo, filial_selecionada, natureza_selecionada)
     
     # 3ª Exibir as 3 visões em abas
     tab1, tab2, tab3 = st.tabs([